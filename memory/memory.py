@@ -0,0 +1,85 @@
+import os
+import time
+import resource
+import threading
+import tracemalloc
+
+_page_size = os.sysconf("SC_PAGE_SIZE")
+
+def current_rss():
+    "Resident set size of process in MB"
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _page_size / 1024 / 1024
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def reset_peak_rss():
+    "Reset peak resident set size of process, works on Linux only. Returns true if it was reset"
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except IOError:
+        return False
+
+def peak_rss():
+    "Peak resident set size of process in MB"
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) // 1024
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+class MemoryMonitor:
+    """Measure peak memory usage of code block
+
+    Resident set size of process is sampled in background thread every
+    interval seconds while code block runs, kernel peak RSS counter is
+    used too when it can be reset, otherwise it holds peak of the whole
+    process lifetime and only sampled RSS is used. When trace is true, peak of memory
+    allocated by Python and NumPy is also measured with tracemalloc,
+    it is precise but slows execution down significantly.
+
+    Results in MB are available after code block is finished:
+    peak_rss is the highest RSS, delta_rss is the highest RSS minus RSS
+    before code block and traced_peak is tracemalloc peak (None if
+    trace is false).
+    """
+
+    def __init__(self, interval=0.01, trace=False):
+        self.interval = interval
+        self.trace = trace
+        self.peak_rss = None
+        self.delta_rss = None
+        self.traced_peak = None
+
+    def __sample(self):
+        while not self.__stop.wait(self.interval):
+            self.__peak = max(self.__peak, current_rss())
+
+    def __enter__(self):
+        self.__peak_reset = reset_peak_rss()
+        self.__start = current_rss()
+        self.__peak = self.__start
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__sample, daemon=True)
+        self.__thread.start()
+        if self.trace:
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.trace:
+            self.traced_peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+        self.__stop.set()
+        self.__thread.join()
+        self.peak_rss = max(self.__peak, current_rss())
+        if self.__peak_reset:
+            self.peak_rss = max(self.peak_rss, peak_rss())
+        self.delta_rss = self.peak_rss - self.__start
+        return False
@@ -7,12 +7,37 @@ from pandas.api.types import CategoricalDtype
 from io import StringIO
 from glob import glob
 import os
+import re
 import time
 import pathlib
 import sys
 import argparse
 
 import_query_template = "COPY %s FROM '%s' WITH (DELIMITER='|');"
+copy_table_query_template = "CREATE TABLE %s AS (SELECT * FROM %s) WITH (FRAGMENT_SIZE=%d);"
+staging_table_name_template = "staging_%s"
+staged_tables = set()
+
+def load_table(con, table_name, create_table_template, file_path, fragment_size):
+    """ Creates table with fragment size and fills it with data from file.
+    With --staging file is imported only once into staging table and
+    table is created as a copy of it for every fragment size.
+    """
+
+    if not args.staging:
+        con.execute(create_table_template.replace("##FRAGMENT_SIZE##", str(fragment_size)))
+        con.execute(import_query_template % (table_name, file_path))
+        return
+
+    staging_table = staging_table_name_template % re.sub("[^0-9A-Za-z_]", "_", os.path.basename(file_path))
+    if staging_table not in staged_tables:
+        print("IMPORTING", file_path, "INTO STAGING TABLE", staging_table)
+        con.execute("DROP TABLE IF EXISTS %s;" % staging_table)
+        create_staging_table = create_table_template.replace("CREATE TABLE %s (" % table_name, "CREATE TABLE %s (" % staging_table)
+        con.execute(create_staging_table.replace("##FRAGMENT_SIZE##", str(fragment_size)))
+        con.execute(import_query_template % (staging_table, file_path))
+        staged_tables.add(staging_table)
+    con.execute(copy_table_query_template % (table_name, staging_table, fragment_size))
 
 def run_pd_workflow(quarter, year, perf_file, fragment_size):
     t1 = time.time()
@@ -147,11 +172,7 @@ CREATE TABLE perf (
     servicing_activity_indicator TEXT ENCODING DICT(16)
 ) WITH (FRAGMENT_SIZE= ##FRAGMENT_SIZE## );
 """
-    create_table_names = create_table_names_temlate.replace("##FRAGMENT_SIZE##", str(fragment_size))
-    import_query = import_query_template % ("perf", performance_path)
-
-    con.execute(create_table_names)
-    con.execute(import_query)
+    load_table(con, "perf", create_table_names_temlate, performance_path, fragment_size)
 
 def pd_load_acquisition_csv(acquisition_path, con, fragment_size):
     """ Loads acquisition data
@@ -237,11 +258,7 @@ CREATE TABLE acq (
     year_quarter BIGINT
 ) WITH (FRAGMENT_SIZE= ##FRAGMENT_SIZE## );
 """
-    create_table_names = create_table_names_temlate.replace("##FRAGMENT_SIZE##", str(fragment_size))
-    import_query = import_query_template % ("acq", acquisition_path)
-
-    con.execute(create_table_names)
-    con.execute(import_query)
+    load_table(con, "acq", create_table_names_temlate, acquisition_path, fragment_size)
 
 def pd_load_names(con, fragment_size):
     """ Loads names used for renaming the banks
@@ -266,11 +283,7 @@ CREATE TABLE names (
     new_seller_name TEXT ENCODING DICT(32)
 ) WITH (FRAGMENT_SIZE= ##FRAGMENT_SIZE## );
 """
-    create_table_names = create_table_names_temlate.replace("##FRAGMENT_SIZE##", str(fragment_size))
-    import_query = import_query_template % ("names", os.path.join(data_directory, "names.csv"))
-
-    con.execute(create_table_names)
-    con.execute(import_query)
+    load_table(con, "names", create_table_names_temlate, os.path.join(data_directory, "names.csv"), fragment_size)
 
 def create_ever_features():
     #everdf = pdf[['loan_id', 'current_loan_delinquency_status']]
@@ -558,6 +571,7 @@ parser.add_argument('-r', default="report_pandas.csv", help="Report file name.")
 parser.add_argument('-df', default=1, type=int, help="Number of datafiles (quarters) to input into database for processing.")
 parser.add_argument('-dp', required=True, help="Path to root of mortgage datafiles directory (contains names.csv).")
 parser.add_argument('-i', dest="iterations", default=5, type=int, help="Number of iterations to run every benchmark. Best result is selected.")
+parser.add_argument('-staging', action='store_true', help="Import every data file only once into a staging table and create tables for every fragment size and iteration as copies of staging tables instead of parsing data files again.")
 parser.add_argument("-port", default=62074, type=int, help="TCP port that omnisql client should use to connect to server")
 
 parser.add_argument("-db-server", default="localhost", help="Host name of MySQL server")
@@ -642,6 +656,9 @@ for fs in args.fragment_size:
             bestTotalTime = ttt
         avgTotalTime += ttt
 
+for staging_table in staged_tables:
+    con.execute("DROP TABLE IF EXISTS %s;" % staging_table)
+
 avgExecTime /= args.iterations
 avgTotalTime /= args.iterations
 
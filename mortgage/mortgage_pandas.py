@@ -6,57 +6,402 @@ from pymapd import connect
 from pandas.api.types import CategoricalDtype
 from io import StringIO
 from glob import glob
+import concurrent.futures
+import multiprocessing
+import operator
+import hashlib
+import inspect
 import os
 import time
 import pathlib
 import sys
 import argparse
 
-def run_pd_workflow(quarter=1, year=2000, perf_file="", **kwargs):
+def run_pd_workflow(quarter=1, year=2000, perf_file="", names=None, **kwargs):
+    global stage_cache_key
     t1 = time.time()
-    names = pd_load_names()
     year_string = str(year) + "Q" + str(quarter) + ".txt"
     acq_file = os.path.join(data_directory, "acq", "Acquisition_" + year_string)
+    if args.stage_cache is not None:
+        stage_cache_key = input_files_key([os.path.join(data_directory, "names.csv"), acq_file, perf_file])
+    if names is None:
+        names = run_stage('load_names', pd_load_names)
     print("READING DATAFILE", acq_file)
-    acq_pdf = pd_load_acquisition_csv(acq_file)
+    t2 = time.time()
+    acq_pdf = run_stage('load_acquisition', pd_load_acquisition_csv, acq_file, acq_columns)
+    acq_time = (time.time() - t2) * 1000
 
     print("READING DATAFILE", perf_file)
-    perf_df_tmp = pd_load_performance_csv(perf_file)
+    t2 = time.time()
+    perf_df_tmp = run_stage('load_performance', pd_load_performance_csv, perf_file, perf_columns)
+    perf_time = (time.time() - t2) * 1000
     print("read time", (time.time() - t1) * 1000)
+    if args.load_report is not None:
+        record_load(os.path.basename(perf_file), {
+            'perf_file': perf_file,
+            'acq_file': acq_file,
+            'perf_parse_ms': perf_time,
+            'perf_memory_mb': perf_df_tmp.memory_usage(deep=True).sum() / 1024 / 1024,
+            'acq_parse_ms': acq_time,
+            'acq_memory_mb': acq_pdf.memory_usage(deep=True).sum() / 1024 / 1024
+        })
 
     t1 = time.time()
 
-    acq_pdf = acq_pdf.merge(names, how='left', on=['seller_name'])
-    acq_pdf.drop(columns=['seller_name'], inplace=True)
-    acq_pdf['seller_name'] = acq_pdf['new']
-    acq_pdf.drop(columns=['new'], inplace=True)
+    acq_pdf = run_stage('rename_sellers', rename_sellers, acq_pdf, names)
 
     pdf = perf_df_tmp
-    everdf = create_ever_features(pdf)
-    delinq_merge = create_delinq_features(pdf)
-    everdf = join_ever_delinq_features(everdf, delinq_merge)
-    del(delinq_merge)
-
-    joined_df = create_joined_df(pdf, everdf)
-    testdf = create_12_mon_features(joined_df)
-    joined_df = combine_joined_12_mon(joined_df, testdf)
-    del(testdf)
-
-    perf_df = final_performance_delinquency(pdf, joined_df)
-    del(pdf, joined_df)
+    if args.compact:
+        loan_ids = run_stage('unique_loan_ids', unique_loan_ids, acq_pdf, pdf)
+        acq_pdf = run_stage('encode_loan_ids', encode_loan_ids, acq_pdf, loan_ids)
+        pdf = run_stage('encode_loan_ids', encode_loan_ids, pdf, loan_ids)
+    if args.partitions is not None:
+        perf_df = run_stage('create_features_partitioned', create_features_partitioned, pdf)
+    else:
+        perf_df = create_features(pdf)
+    del(pdf)
 
-    final_pdf = join_perf_acq_pdfs(perf_df, acq_pdf)
+    final_pdf = run_stage('join_perf_acq_pdfs', join_perf_acq_pdfs, perf_df, acq_pdf)
     del(perf_df)
     del(acq_pdf)
 
     print("compute time", (time.time() - t1) * 1000)
-    final_pdf = last_mile_cleaning(final_pdf)
+    final_pdf = run_stage('last_mile_cleaning', last_mile_cleaning, final_pdf)
+    if args.compact:
+        final_pdf = run_stage('decode_loan_ids', decode_loan_ids, final_pdf, loan_ids)
     exec_time = (time.time() - t1) * 1000
     print("compute time with copy to host", exec_time)
     return final_pdf, exec_time
 
-def pd_load_performance_csv(performance_path, **kwargs):
-    """ Loads performance data
+def create_features(pdf):
+    "Feature stages, all of them group and join performance data by loan_id"
+    if args.kernels == 'numba':
+        everdf = run_stage('create_ever_delinq_features_numba', create_ever_delinq_features_numba, pdf)
+    else:
+        everdf = run_stage('create_ever_features', create_ever_features, pdf)
+        delinq_merge = run_stage('create_delinq_features', create_delinq_features, pdf)
+        everdf = run_stage('join_ever_delinq_features', join_ever_delinq_features, everdf, delinq_merge)
+        del(delinq_merge)
+    if args.kernels == 'both':
+        everdf_numba = run_stage('create_ever_delinq_features_numba', create_ever_delinq_features_numba, pdf)
+        check_results('join_ever_delinq_features', everdf, 'create_ever_delinq_features_numba', everdf_numba)
+        del(everdf_numba)
+
+    joined_df = run_stage('create_joined_df', create_joined_df_lowcopy if args.lowcopy else create_joined_df, pdf, everdf)
+    loop_12_mon_features = create_12_mon_features_lowcopy if args.lowcopy else create_12_mon_features
+    if args.kernels == 'numba':
+        testdf = run_stage('create_12_mon_features_numba', create_12_mon_features_numba, joined_df)
+    elif args.mon12 == 'both':
+        testdf = run_stage('create_12_mon_features', loop_12_mon_features, joined_df)
+        testdf_vectorized = run_stage('create_12_mon_features_vectorized', create_12_mon_features_vectorized, joined_df)
+        check_results('create_12_mon_features', testdf, 'create_12_mon_features_vectorized', testdf_vectorized)
+        del(testdf_vectorized)
+    elif args.mon12 == 'vectorized':
+        testdf = run_stage('create_12_mon_features_vectorized', create_12_mon_features_vectorized, joined_df)
+    else:
+        testdf = run_stage('create_12_mon_features', loop_12_mon_features, joined_df)
+    if args.kernels == 'both':
+        testdf_numba = run_stage('create_12_mon_features_numba', create_12_mon_features_numba, joined_df)
+        check_results('create_12_mon_features', testdf, 'create_12_mon_features_numba', testdf_numba)
+        del(testdf_numba)
+    joined_df = run_stage('combine_joined_12_mon', combine_joined_12_mon, joined_df, testdf)
+    del(testdf)
+
+    perf_df = run_stage('final_performance_delinquency',
+                        final_performance_delinquency_lowcopy if args.lowcopy else final_performance_delinquency, pdf, joined_df)
+    del(joined_df)
+    return perf_df
+
+def check_results(stage, df, other_stage, other_df):
+    "Warn if two implementations of stage give different results"
+    if not df.equals(other_df) or not df.index.equals(other_df.index):
+        print("WARNING: RESULTS OF", stage, "AND", other_stage, "DIFFER")
+
+# Wall time, CPU time, output rows and output size of every workflow stage
+# in current iteration and number of its runs loaded from stage cache, best
+# wall and CPU time over iterations and maximum memory usage over all runs
+# of the stage
+stage_times = {}
+stage_cpu_times = {}
+stage_rows = {}
+stage_output_mb = {}
+stage_cached = {}
+stage_best_times = {}
+stage_best_cpu_times = {}
+stage_memory = {}
+
+# Statistics of stages in current process as they are passed from worker
+# processes
+stage_statistics = {
+    'times': stage_times,
+    'cpu_times': stage_cpu_times,
+    'rows': stage_rows,
+    'output_mb': stage_output_mb,
+    'cached': stage_cached,
+    'memory': stage_memory
+}
+
+def run_stage(stage, func, *stage_args):
+    """ Runs workflow stage measuring its wall and CPU time, output rows and,
+    if requested, output size and memory usage
+
+    Output of stages which load or merge frames is downcast when compact
+    dtypes are enabled. When stage cache is enabled, output of stage is
+    taken from cache if it was stored by earlier run with the same inputs
+    and code, otherwise it is stored there. Time of stage loaded from cache
+    is time of loading, such stages are marked in report.
+    """
+    global stage_cache_key
+    cache_file = None
+    if args.stage_cache is not None:
+        stage_cache_key = hashlib.sha1((stage_cache_key + stage + stage_code(func)).encode()).hexdigest()
+        cache_file = os.path.join(args.stage_cache, stage + "-" + stage_cache_key + ".pkl")
+        if os.path.exists(cache_file):
+            print("STAGE", stage, "LOADED FROM CACHE", cache_file)
+            func, stage_args, cache_file = pd.read_pickle, (cache_file,), None
+            stage_cached[stage] = stage_cached.get(stage, 0) + 1
+    if args.mem:
+        with memory.MemoryMonitor(args.mem_interval / 1000, args.tracemalloc) as monitor:
+            t1 = time.time()
+            cpu1 = time.process_time()
+            result = func(*stage_args)
+            cpu2 = time.process_time()
+            t2 = time.time()
+        usage = stage_memory.setdefault(stage, dict.fromkeys(['peak_rss', 'delta_rss', 'traced_peak']))
+        for key in usage:
+            value = getattr(monitor, key)
+            if value is not None:
+                usage[key] = value if usage[key] is None else max(usage[key], value)
+    else:
+        t1 = time.time()
+        cpu1 = time.process_time()
+        result = func(*stage_args)
+        cpu2 = time.process_time()
+        t2 = time.time()
+    if args.compact and stage in compact_stages:
+        t3 = time.time()
+        cpu3 = time.process_time()
+        result = compact_dtypes(result)
+        t2 += time.time() - t3
+        cpu2 += time.process_time() - cpu3
+    stage_times[stage] = stage_times.get(stage, 0) + (t2 - t1) * 1000
+    stage_cpu_times[stage] = stage_cpu_times.get(stage, 0) + (cpu2 - cpu1) * 1000
+    stage_rows[stage] = stage_rows.get(stage, 0) + len(result)
+    if args.stages:
+        output_bytes = result.nbytes if isinstance(result, np.ndarray) else result.memory_usage(deep=True).sum()
+        stage_output_mb[stage] = stage_output_mb.get(stage, 0) + output_bytes / 1024 / 1024
+    if cache_file is not None:
+        store_stage_output(result, cache_file)
+    return result
+
+# Key of last stage output in cache, it is chained from key of input files
+# through names and code of all stages run after them
+stage_cache_key = ""
+
+def input_files_key(files):
+    "Key of input files and options changing their loading, files are identified by path, size and modification time"
+    key = hashlib.sha1()
+    for f in files:
+        stat = os.stat(f)
+        key.update(("%s %d %d\n" % (os.path.abspath(f), stat.st_size, stat.st_mtime_ns)).encode())
+    key.update(("%s %s %s %s" % (args.engine, args.prune, args.dates, args.compact)).encode())
+    return key.hexdigest()
+
+def stage_code(func, seen=None):
+    "Source code of function and of all functions of this script it calls"
+    seen = set() if seen is None else seen
+    seen.add(func.__name__)
+    code = inspect.getsource(func)
+    for name in func.__code__.co_names:
+        # Compiled kernels are identified by code of Python function
+        called = getattr(globals().get(name), 'py_func', globals().get(name))
+        if inspect.isfunction(called) and called.__module__ == func.__module__ and name not in seen:
+            code += stage_code(called, seen)
+    return code
+
+def store_stage_output(result, cache_file):
+    "Store output of stage in cache, temporary file is renamed so that concurrent runs never read partial output"
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = "%s.%d.tmp" % (cache_file, os.getpid())
+    pd.to_pickle(result, tmp_file)
+    os.replace(tmp_file, cache_file)
+
+def clear_stage_statistics():
+    for statistics in stage_statistics.values():
+        statistics.clear()
+
+def combine_stage_statistics(target, statistics, combine_times):
+    "Add statistics of stages to target, wall times are combined by combine_times, CPU times, rows, output sizes and cache loads are summed"
+    for name, combine in (('times', combine_times), ('cpu_times', operator.add), ('rows', operator.add), ('output_mb', operator.add),
+                          ('cached', operator.add)):
+        for stage, value in statistics[name].items():
+            target[name][stage] = combine(target[name][stage], value) if stage in target[name] else value
+    for stage, stage_usage in statistics['memory'].items():
+        current = target['memory'].setdefault(stage, dict.fromkeys(stage_usage))
+        for key, value in stage_usage.items():
+            if value is not None:
+                current[key] = value if current[key] is None else max(current[key], value)
+
+# Stages whose output is downcast by compact_dtypes, they load frames or
+# merge them making integer columns float
+compact_stages = {
+    'load_performance', 'rename_sellers', 'join_ever_delinq_features', 'create_joined_df',
+    'combine_joined_12_mon', 'final_performance_delinquency', 'join_perf_acq_pdfs'
+}
+# Join keys keep their types, loan_id is encoded by encode_loan_ids
+compact_keys = ['loan_id', 'timestamp_year', 'timestamp_month']
+compact_categorical_columns = ['seller_name', 'servicer']
+# Flags and statuses which are restored as nullable integers when missing
+# values of merge make them float
+compact_flag_columns = ['current_loan_delinquency_status', 'ever_30', 'ever_90', 'ever_180', 'delinquency_12']
+# Dates, including sentinel filled ones, are not downcast: datetime64 takes
+# 8 bytes in every unit, a coarser unit would change output types only
+
+def smallest_integers(values, nullable=False):
+    "Cast integer values to the smallest integer type holding them, nullable one if requested"
+    if not values.notna().any():
+        # No values or only missing ones, comparisons with their minimum are undefined
+        return values.astype('Int8' if nullable else 'int8')
+    low, high = values.min(), values.max()
+    for dtype in ['int8', 'int16', 'int32', 'int64']:
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            break
+    return values.astype(dtype.capitalize() if nullable else dtype)
+
+def compact_dtypes(df):
+    """ Downcasts columns of frame to compact types
+
+    Integer columns except join keys are cast to the smallest type holding
+    their values, flags which merges made float are restored as nullable
+    integers and names of sellers and servicers become categorical.
+
+    Returns
+    -------
+    PD DataFrame
+    """
+
+    for column in df.columns:
+        values = df[column]
+        if column in compact_keys:
+            continue
+        if column in compact_categorical_columns:
+            if pd.api.types.is_string_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype):
+                df[column] = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            df[column] = smallest_integers(values, pd.api.types.is_extension_array_dtype(values.dtype))
+        elif column in compact_flag_columns and pd.api.types.is_float_dtype(values.dtype):
+            if (values.dropna() % 1 == 0).all():
+                df[column] = smallest_integers(values.astype('Int64'), True)
+    return df
+
+def unique_loan_ids(acq_pdf, pdf, **kwargs):
+    "Sorted loan ids of acquisition and performance data"
+    return np.union1d(acq_pdf['loan_id'].to_numpy(), pd.unique(pdf['loan_id'].to_numpy()))
+
+def encode_loan_ids(df, loan_ids, **kwargs):
+    "Replace loan_id by dense int32 key, its index in sorted loan ids"
+    df['loan_id'] = np.searchsorted(loan_ids, df['loan_id'].to_numpy()).astype('int32')
+    return df
+
+def decode_loan_ids(df, loan_ids, **kwargs):
+    "Restore loan_id from dense key"
+    df['loan_id'] = loan_ids[df['loan_id'].to_numpy()]
+    return df
+
+# Columns of performance and acquisition data used by workflow, only
+# they are read when pruning is enabled
+perf_workflow_columns = ['loan_id', 'monthly_reporting_period', 'current_loan_delinquency_status', 'current_actual_upb']
+acq_workflow_columns = ['loan_id', 'seller_name']
+perf_columns = None
+acq_columns = None
+
+# Parse time and memory of every performance file and its acquisition
+# file, the fastest load over iterations is kept
+file_loads = {}
+
+def measure_full_load(load):
+    "Parse time and memory of performance and acquisition files with all columns, they are compared with pruned load"
+    t1 = time.time()
+    perf_df = pd_load_performance_csv(load['perf_file'])
+    perf_time = (time.time() - t1) * 1000
+    perf_memory = perf_df.memory_usage(deep=True).sum() / 1024 / 1024
+    del(perf_df)
+    t1 = time.time()
+    acq_pdf = pd_load_acquisition_csv(load['acq_file'])
+    acq_time = (time.time() - t1) * 1000
+    acq_memory = acq_pdf.memory_usage(deep=True).sum() / 1024 / 1024
+    del(acq_pdf)
+    return perf_time, perf_memory, acq_time, acq_memory
+
+def record_load(name, load):
+    if name not in file_loads or file_loads[name]['perf_parse_ms'] > load['perf_parse_ms']:
+        file_loads[name] = load
+
+# Names table is loaded once before worker processes are forked, so
+# they share it read only
+shared_names = None
+
+def run_quarter(year, quarter, perf_file):
+    "Run workflow for performance file in worker process, returns exec time, total time, CPU time, statistics of stages and loads"
+    clear_stage_statistics()
+    file_loads.clear()
+    t1 = time.time()
+    cpu1 = time.process_time()
+    dataframe, exec_time = run_pd_workflow(year=year, quarter=quarter, perf_file=perf_file, names=shared_names)
+    del(dataframe)
+    return exec_time, (time.time() - t1) * 1000, (time.process_time() - cpu1) * 1000, \
+        {name: dict(statistics) for name, statistics in stage_statistics.items()}, dict(file_loads)
+
+# Partitions of performance data, worker processes forked to create
+# features for them get partitions without copying
+perf_partitions = None
+
+def create_features_partition(partition):
+    "Create features for partition of performance data in worker process"
+    global stage_cache_key
+    clear_stage_statistics()
+    stage_cache_key += "partition %d/%d" % (partition, len(perf_partitions))
+    perf_df = create_features(perf_partitions[partition])
+    return perf_df, {name: dict(statistics) for name, statistics in stage_statistics.items()}
+
+def create_features_partitioned(pdf):
+    """ Creates features for performance data hash partitioned by loan_id
+
+    Partitions are processed in parallel by at most as many worker
+    processes as there are cores, times of stages are taken from the
+    slowest partition, their CPU times, rows and output sizes are summed
+    over partitions. Rows of result are
+    ordered by partition.
+
+    Returns
+    -------
+    PD DataFrame
+    """
+
+    global perf_partitions
+    partition_ids = pdf['loan_id'].to_numpy() % args.partitions
+    perf_partitions = [pdf[partition_ids == p] for p in range(args.partitions)]
+    perf_partitions = [partition for partition in perf_partitions if len(partition) > 0]
+    # Partitions queue for processes when there are more of them than cores
+    processes = min(len(perf_partitions), os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("fork")) as pool:
+        results = list(pool.map(create_features_partition, range(len(perf_partitions))))
+    perf_partitions = None
+    partitions_statistics = {name: {} for name in stage_statistics}
+    for perf_df, statistics in results:
+        combine_stage_statistics(partitions_statistics, statistics, max)
+    combine_stage_statistics(stage_statistics, partitions_statistics, operator.add)
+    return pd.concat([perf_df for perf_df, statistics in results], ignore_index=True)
+
+def rename_sellers(acq_pdf, names, **kwargs):
+    acq_pdf = acq_pdf.merge(names, how='left', on=['seller_name'])
+    acq_pdf.drop(columns=['seller_name'], inplace=True)
+    acq_pdf['seller_name'] = acq_pdf['new']
+    acq_pdf.drop(columns=['new'], inplace=True)
+    return acq_pdf
+
+def pd_load_performance_csv(performance_path, columns=None, **kwargs):
+    """ Loads performance data, all columns or only specified ones
 
     Returns
     -------
@@ -108,17 +453,24 @@ def pd_load_performance_csv(performance_path, **kwargs):
         "servicing_activity_indicator": CategoricalDtype(['N', 'Y']),
     }
 
-    return pd.read_csv(performance_path, names=cols, delimiter='|', dtype=dtypes, parse_dates=[1,8,13,14,15,16])
+    if columns is None:
+        columns = cols
+    date_columns = [c for c in [cols[i] for i in [1, 8, 13, 14, 15, 16]] if c in columns]
+    if args.dates is None:
+        return pd.read_csv(performance_path, names=cols, usecols=columns, delimiter='|', dtype={c: dtypes[c] for c in columns},
+                           parse_dates=date_columns)
+    df = pd.read_csv(performance_path, names=cols, usecols=columns, delimiter='|', dtype={c: dtypes[c] for c in columns})
+    return convert_dates(df, date_columns)
 
-def pd_load_acquisition_csv(acquisition_path, **kwargs):
-    """ Loads acquisition data
+def pd_load_acquisition_csv(acquisition_path, columns=None, **kwargs):
+    """ Loads acquisition data, all columns or only specified ones
 
     Returns
     -------
     PD DataFrame
     """
 
-    columns = [
+    cols = [
         'loan_id', 'orig_channel', 'seller_name', 'orig_interest_rate', 'orig_upb', 'orig_loan_term',
         'orig_date', 'first_pay_date', 'orig_ltv', 'orig_cltv', 'num_borrowers', 'dti', 'borrower_credit_score',
         'first_home_buyer', 'loan_purpose', 'property_type', 'num_units', 'occupancy_status', 'property_state',
@@ -159,9 +511,43 @@ def pd_load_acquisition_csv(acquisition_path, **kwargs):
         'year_quarter': np.int64
     }
 
-    a = pd.read_csv(acquisition_path, names=columns, delimiter='|', dtype=dtypes, parse_dates=[6,7], error_bad_lines=True, warn_bad_lines=True, na_filter=True)
+    if columns is None:
+        columns = cols
+    date_columns = [c for c in [cols[i] for i in [6, 7]] if c in columns]
+    if args.dates is None:
+        a = pd.read_csv(acquisition_path, names=cols, usecols=columns, delimiter='|', dtype={c: dtypes[c] for c in columns},
+                        parse_dates=date_columns, error_bad_lines=True, warn_bad_lines=True, na_filter=True)
+    else:
+        a = pd.read_csv(acquisition_path, names=cols, usecols=columns, delimiter='|', dtype={c: dtypes[c] for c in columns},
+                        error_bad_lines=True, warn_bad_lines=True, na_filter=True)
+        a = convert_dates(a, date_columns)
     return a
 
+# Dates parsed by cached conversion, they are kept for all quarters
+parsed_dates = {}
+
+def parse_dates_cached(column):
+    "Parse every distinct string of column once and broadcast parsed dates to rows by codes of strings"
+    codes, uniques = pd.factorize(column)
+    new_uniques = [u for u in uniques if u not in parsed_dates]
+    if new_uniques:
+        parsed_dates.update(zip(new_uniques, pd.to_datetime(pd.Series(new_uniques))))
+    # Dates keep unit returned by pd.to_datetime, missing values have code -1 and become NaT
+    dates = pd.DatetimeIndex(pd.to_datetime(pd.Series([parsed_dates[u] for u in uniques], dtype=object)))
+    return pd.Series(dates.take(codes, allow_fill=True, fill_value=pd.NaT), index=column.index, name=column.name)
+
+def convert_dates(df, date_columns):
+    "Convert string columns to dates, time of every column is recorded as a stage"
+    for c in date_columns:
+        t1 = time.time()
+        if args.dates == 'cached':
+            df[c] = parse_dates_cached(df[c])
+        else:
+            df[c] = pd.to_datetime(df[c])
+        stage = 'parse_dates:' + c
+        stage_times[stage] = stage_times.get(stage, 0) + (time.time() - t1) * 1000
+    return df
+
 def pd_load_names(**kwargs):
     """ Loads names used for renaming the banks
 
@@ -249,6 +635,39 @@ def create_joined_df(pdf, everdf, **kwargs):
 
     return joined_df
 
+def create_joined_df_lowcopy(pdf, everdf, **kwargs):
+    """ Computes the same result as create_joined_df with fewer copies
+
+    Frame is built from columns of pdf under their new names instead of
+    slicing pdf and renaming by adding and dropping columns, month and
+    year are downcast as soon as they are computed and missing features
+    are filled by single call.
+
+    Returns
+    -------
+    PD DataFrame
+    """
+
+    timestamp = pdf['monthly_reporting_period']
+    test = pd.DataFrame({
+        'loan_id': pdf['loan_id'],
+        'timestamp': timestamp,
+        'timestamp_month': timestamp.dt.month.astype('int32'),
+        'timestamp_year': timestamp.dt.year.astype('int32'),
+        'delinquency_12': pdf['current_loan_delinquency_status'].fillna(-1),
+        'upb_12': pdf['current_actual_upb'].fillna(999999999)
+    }, copy=False)
+    del(pdf)
+    del(timestamp)
+
+    joined_df = test.merge(everdf, how='left', on=['loan_id'])
+    del(everdf)
+    del(test)
+
+    joined_df.fillna({column: -1 for column in
+                      ['ever_30', 'ever_90', 'ever_180', 'delinquency_30', 'delinquency_90', 'delinquency_180']}, inplace=True)
+    return joined_df
+
 def create_12_mon_features(joined_df, **kwargs):
     testdfs = []
     n_months = 12
@@ -268,6 +687,234 @@ def create_12_mon_features(joined_df, **kwargs):
 
     return pd.concat(testdfs)
 
+def create_12_mon_features_lowcopy(joined_df, **kwargs):
+    """ Computes the same features as create_12_mon_features with fewer copies
+
+    Columns are sliced and months are computed once for all month
+    offsets, group key of every offset is passed to groupby as series
+    instead of being added to copy of the slice.
+
+    Returns
+    -------
+    PD DataFrame
+    """
+
+    testdfs = []
+    n_months = 12
+    features = joined_df[['loan_id', 'delinquency_12', 'upb_12']]
+    josh_months = (joined_df['timestamp_year'] * 12 + joined_df['timestamp_month']).astype('float64') - 24000
+    del(joined_df)
+    for y in range(1, n_months + 1):
+        josh_mody_n = np.floor((josh_months - y) / 12).rename('josh_mody_n')
+        tmpdf = features.groupby(['loan_id', josh_mody_n]).agg({'delinquency_12': 'max','upb_12': 'min'}).reset_index()
+        tmpdf['delinquency_12'] = (tmpdf['delinquency_12'] > 3).astype('int32') + (tmpdf['upb_12'] == 0).astype('int32')
+        tmpdf['timestamp_year'] = np.floor(((tmpdf['josh_mody_n'] * n_months) + 24000 + (y - 1)) / 12).astype('int16')
+        tmpdf['timestamp_month'] = np.int8(y)
+        tmpdf.drop(columns=['josh_mody_n'], inplace=True)
+        testdfs.append(tmpdf)
+        del(tmpdf)
+
+    return pd.concat(testdfs)
+
+def create_12_mon_features_vectorized(joined_df, **kwargs):
+    """ Computes the same features as create_12_mon_features in single pass
+
+    Rows are sorted by loan and month once. Month offsets 1..12 are
+    replicated along first axis of 2D array of group keys, so groups of
+    every offset are contiguous and max/min are computed for all of them
+    with single reduceat call.
+
+    Returns
+    -------
+    PD DataFrame
+    """
+
+    n_months = 12
+    if len(joined_df) == 0:
+        return create_12_mon_features(joined_df)
+    loan_id = joined_df['loan_id'].to_numpy()
+    josh_months = joined_df['timestamp_year'].to_numpy() * 12 + joined_df['timestamp_month'].to_numpy()
+    order = np.lexsort((josh_months, loan_id))
+    loan_id = loan_id[order]
+    josh_months = josh_months[order]
+    delinquency_12 = joined_df['delinquency_12'].to_numpy()[order]
+    upb_12 = joined_df['upb_12'].to_numpy()[order]
+    rows = len(loan_id)
+
+    y = np.arange(1, n_months + 1).reshape(-1, 1)
+    josh_mody_n = np.floor((josh_months.astype('float64') - 24000 - y) / 12)
+    group_starts = np.ones((n_months, rows), dtype=bool)
+    group_starts[:, 1:] = (loan_id[1:] != loan_id[:-1]) | (josh_mody_n[:, 1:] != josh_mody_n[:, :-1])
+    group_starts = np.flatnonzero(group_starts)
+    delinquency_max = np.fmax.reduceat(np.tile(delinquency_12, n_months), group_starts)
+    upb_min = np.fmin.reduceat(np.tile(upb_12, n_months), group_starts)
+
+    group_y = group_starts // rows + 1
+    group_mody_n = josh_mody_n.ravel()[group_starts]
+    testdf = pd.DataFrame({
+        'loan_id': loan_id[group_starts % rows],
+        'delinquency_12': (delinquency_max > 3).astype('int32') + (upb_min == 0).astype('int32'),
+        'upb_12': upb_min,
+        'timestamp_year': np.floor(((group_mody_n * n_months) + 24000 + (group_y - 1)) / 12).astype('int16'),
+        'timestamp_month': group_y.astype('int8')
+    })
+    # Same index as concatenation of groupby results for every month offset
+    testdf.index = np.arange(len(testdf)) - np.searchsorted(group_y, group_y)
+    return testdf
+
+# Kernels are compiled by Numba when they are enabled, they are run over
+# rows sorted by loan_id where rows of every loan are contiguous
+nat = np.iinfo(np.int64).min
+
+def ever_delinq_kernel(loan_id, status, dates):
+    "Maximum delinquency status and first dates of status at least 1, 3 and 6 of every loan, 0 if there are no such dates"
+    loans = 0
+    for i in range(len(loan_id)):
+        if i == 0 or loan_id[i] != loan_id[i - 1]:
+            loans += 1
+    loan_ids = np.empty(loans, loan_id.dtype)
+    max_status = np.empty(loans, status.dtype)
+    first_dates = np.full((3, loans), np.iinfo(np.int64).max)
+    thresholds = np.array([1, 3, 6])
+    g = -1
+    for i in range(len(loan_id)):
+        if i == 0 or loan_id[i] != loan_id[i - 1]:
+            g += 1
+            loan_ids[g] = loan_id[i]
+            max_status[g] = status[i]
+        elif status[i] > max_status[g]:
+            max_status[g] = status[i]
+        if dates[i] != nat:
+            for k in range(3):
+                if status[i] >= thresholds[k] and dates[i] < first_dates[k, g]:
+                    first_dates[k, g] = dates[i]
+    for k in range(3):
+        for g in range(loans):
+            if first_dates[k, g] == np.iinfo(np.int64).max:
+                first_dates[k, g] = 0
+    return loan_ids, max_status, first_dates
+
+def loan_12_mon_kernel(loan_id, josh_months, delinquency_12, upb_12, n_months):
+    """ Maximum delinquency and minimum upb of every loan over 12 month
+    periods for every month offset, rows of every loan are sorted by month
+
+    Groups of every offset are counted first, then they are filled at
+    positions they have in concatenation of groupby results for offsets.
+    """
+    counts = np.zeros(n_months, np.int64)
+    for i in range(len(loan_id)):
+        new_loan = i == 0 or loan_id[i] != loan_id[i - 1]
+        for y in range(n_months):
+            if new_loan or (josh_months[i] - 24001 - y) // 12 != (josh_months[i - 1] - 24001 - y) // 12:
+                counts[y] += 1
+    groups = counts.sum()
+    out_loan_id = np.empty(groups, loan_id.dtype)
+    out_delinquency = np.empty(groups, delinquency_12.dtype)
+    out_upb = np.empty(groups, upb_12.dtype)
+    out_year = np.empty(groups, np.int16)
+    out_month = np.empty(groups, np.int8)
+    positions = np.zeros(n_months, np.int64)
+    positions[1:] = np.cumsum(counts)[:-1]
+    previous = np.zeros(n_months, np.int64)
+    for i in range(len(loan_id)):
+        new_loan = i == 0 or loan_id[i] != loan_id[i - 1]
+        for y in range(n_months):
+            josh_mody_n = (josh_months[i] - 24001 - y) // 12
+            if new_loan or josh_mody_n != previous[y]:
+                g = positions[y]
+                positions[y] += 1
+                previous[y] = josh_mody_n
+                out_loan_id[g] = loan_id[i]
+                out_delinquency[g] = delinquency_12[i]
+                out_upb[g] = upb_12[i]
+                out_year[g] = (josh_mody_n * 12 + 24000 + y) // 12
+                out_month[g] = y + 1
+            else:
+                g = positions[y] - 1
+                # Missing values are skipped as groupby does
+                if delinquency_12[i] == delinquency_12[i] and not out_delinquency[g] >= delinquency_12[i]:
+                    out_delinquency[g] = delinquency_12[i]
+                if upb_12[i] == upb_12[i] and not out_upb[g] <= upb_12[i]:
+                    out_upb[g] = upb_12[i]
+    return counts, out_loan_id, out_delinquency, out_upb, out_year, out_month
+
+def warm_up_kernels():
+    """ Compiles kernels for types of columns workflow passes to them
+
+    Compilation is done before benchmark iterations and before worker
+    processes are forked, so it is not included in times of stages. With
+    compact dtypes loan_id is int32 and statuses get the smallest type
+    holding their values.
+    """
+
+    loan_types = ['int32'] if args.compact else ['int64']
+    status_types = ['int8', 'int16', 'int32'] if args.compact else ['int32']
+    for loan_type in loan_types:
+        for status_type in status_types:
+            loan_id = np.zeros(1, loan_type)
+            status = np.zeros(1, status_type)
+            ever_delinq_kernel(loan_id, status, np.zeros(1, 'int64'))
+            loan_12_mon_kernel(loan_id, np.zeros(1, 'int64'), status, np.zeros(1, 'float64'), 12)
+
+def create_ever_delinq_features_numba(pdf, **kwargs):
+    """ Computes the same features as create_ever_features, create_delinq_features
+    and join_ever_delinq_features by single compiled pass
+
+    Rows are sorted by loan_id once, maximum status and first delinquency
+    dates of every loan are computed over its contiguous rows.
+
+    Returns
+    -------
+    PD DataFrame
+    """
+
+    loan_id = pdf['loan_id'].to_numpy()
+    order = np.argsort(loan_id, kind='stable')
+    status = pdf['current_loan_delinquency_status'].to_numpy()[order]
+    dates = pdf['monthly_reporting_period'].to_numpy().view('int64')[order]
+    loan_ids, max_status, first_dates = ever_delinq_kernel(loan_id[order], status, dates)
+    # Dates are passed to kernel as integers in unit of the column
+    first_dates = first_dates.view(pdf['monthly_reporting_period'].dtype)
+    return pd.DataFrame({
+        'ever_30': (max_status >= 1).astype('int8'),
+        'ever_90': (max_status >= 3).astype('int8'),
+        'ever_180': (max_status >= 6).astype('int8'),
+        'delinquency_30': first_dates[0],
+        'delinquency_90': first_dates[1],
+        'delinquency_180': first_dates[2]
+    }, index=pd.Index(loan_ids, name='loan_id'))
+
+def create_12_mon_features_numba(joined_df, **kwargs):
+    """ Computes the same features as create_12_mon_features by single compiled pass
+
+    Rows are sorted by loan and month once, groups of all month offsets
+    are updated while rows of every loan are passed.
+
+    Returns
+    -------
+    PD DataFrame
+    """
+
+    n_months = 12
+    if len(joined_df) == 0:
+        return create_12_mon_features(joined_df)
+    loan_id = joined_df['loan_id'].to_numpy()
+    josh_months = joined_df['timestamp_year'].to_numpy().astype('int64') * 12 + joined_df['timestamp_month'].to_numpy()
+    order = np.lexsort((josh_months, loan_id))
+    counts, loan_ids, delinquency_max, upb_min, years, months = loan_12_mon_kernel(
+        loan_id[order], josh_months[order], joined_df['delinquency_12'].to_numpy()[order],
+        joined_df['upb_12'].to_numpy()[order], n_months)
+    testdf = pd.DataFrame({
+        'loan_id': loan_ids,
+        'delinquency_12': (delinquency_max > 3).astype('int32') + (upb_min == 0).astype('int32'),
+        'upb_12': upb_min,
+        'timestamp_year': years,
+        'timestamp_month': months
+    })
+    # Same index as concatenation of groupby results for every month offset
+    testdf.index = np.arange(len(testdf)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return testdf
+
 def combine_joined_12_mon(joined_df, testdf, **kwargs):
     joined_df.drop(columns=['delinquency_12', 'upb_12'], inplace=True)
     joined_df['timestamp_year'] = joined_df['timestamp_year'].astype('int16')
@@ -284,6 +931,25 @@ def final_performance_delinquency(merged, joined_df, **kwargs):
     merged.drop(columns=['timestamp_month'], inplace=True)
     return merged
 
+def final_performance_delinquency_lowcopy(merged, joined_df, **kwargs):
+    """ Computes the same result as final_performance_delinquency with fewer copies
+
+    Join keys are downcast as soon as they are computed and dropped from
+    result by single call.
+
+    Returns
+    -------
+    PD DataFrame
+    """
+
+    timestamp = merged['monthly_reporting_period'].dt
+    merged['timestamp_month'] = timestamp.month.astype('int8')
+    merged['timestamp_year'] = timestamp.year.astype('int16')
+    del(timestamp)
+    merged = merged.merge(joined_df, how='left', on=['loan_id', 'timestamp_year', 'timestamp_month'])
+    merged.drop(columns=['timestamp_year', 'timestamp_month'], inplace=True)
+    return merged
+
 def join_perf_acq_pdfs(perf, acq, **kwargs):
     return perf.merge(acq, how='left', on=['loan_id'])
 
@@ -298,14 +964,33 @@ def last_mile_cleaning(df, **kwargs):
 # Load database reporting functions
 pathToReportDir = os.path.join(pathlib.Path(__file__).parent, "..", "report")
 print(pathToReportDir)
+pathToMemoryDir = os.path.join(pathlib.Path(__file__).parent, "..", "memory")
 sys.path.insert(1, pathToReportDir)
+sys.path.insert(1, pathToMemoryDir)
 import report
+import memory
 
 parser = argparse.ArgumentParser(description='Run Mortgage benchmark using pandas')
 
 parser.add_argument('-r', default="report_pandas.csv", help="Report file name.")
 parser.add_argument('-df', default=1, type=int, help="Number of datafiles (quarters) to input into database for processing.")
 parser.add_argument('-dp', required=True, help="Path to root of mortgage datafiles directory (contains names.csv).")
+parser.add_argument('-engine', default="pandas", choices=['pandas', 'modin'], help="Dataframe engine to run benchmark with. Modin engine is a drop-in replacement of pandas which scales across all cores.")
+parser.add_argument('-modin-engine', dest="modin_engine", default="ray", choices=['ray', 'dask'], help="Execution engine used by Modin.")
+parser.add_argument('-mon12', default="loop", choices=['loop', 'vectorized', 'both'], help="Implementation of 12 month features stage. Loop does groupby for every month offset, vectorized computes all offsets in single pass. Both runs the two implementations, checks that results are identical and reports time of both stages.")
+parser.add_argument('-lowcopy', action='store_true', help="Run create_joined_df, create_12_mon_features and final_performance_delinquency stages by implementations which avoid copies of intermediate frames. Run with -tracemalloc with and without it to compare memory allocated by stages.")
+parser.add_argument('-compact', action='store_true', help="Downcast data after loading and after every merge: loan_id is encoded as dense int32 key, other integers get the smallest type, flags made float by merges become nullable integers and seller and servicer names become categorical. Run with -stages to see size of output of every stage.")
+parser.add_argument('-kernels', default="pandas", choices=['pandas', 'numba', 'both'], help="Implementation of ever, delinquency and 12 month features stages. Numba computes them by compiled passes over rows sorted by loan_id and requires numba package. Both runs the two implementations, checks that results are identical and reports speedup of Numba stages.")
+parser.add_argument('-workers', type=int, help="Number of worker processes to run workflow for quarters and performance files in parallel. Exec time of iteration is its wall time. Time of every performance file, sum of CPU times of performance files and its ratio to wall time, which shows how many cores were busy, are reported.")
+parser.add_argument('-partitions', type=int, help="Number of partitions to hash partition performance data by loan_id into. Feature stages are run for every partition by worker processes, at most one per core, extra partitions wait for a free process.")
+parser.add_argument('-prune', action='store_true', help="Read only columns of performance and acquisition data used by workflow.")
+parser.add_argument('-lr', dest="load_report", help="Load report file name. Parse time and memory of every performance file and its acquisition file are written there when specified. With -prune files are also loaded with all columns after benchmark and time and memory saved by pruning are written too.")
+parser.add_argument('-dates', choices=['parse', 'cached'], help="Convert date columns after reading data instead of parsing them by read_csv. Parse converts every row, cached parses every distinct string once and keeps parsed dates for all quarters. Conversion time of every date column is reported as stage.")
+parser.add_argument('-stages', action='store_true', help="Report wall time, CPU time, peak memory, output rows and output size of every workflow stage, implies -mem.")
+parser.add_argument('-stage-cache', dest="stage_cache", help="Directory to cache outputs of workflow stages in. Output is keyed by hash of input files and code of the stage and all stages before it, so only stages changed since earlier run and stages after them are run again. Requires -i 1, stages loaded from cache are marked in report and their time is time of loading.")
+parser.add_argument('-mem', action='store_true', help="Measure peak and delta resident set size of process for every workflow stage. Maximum over all runs of stage is reported.")
+parser.add_argument('-mem-interval', dest="mem_interval", default=10, type=int, help="Interval in milliseconds to sample resident set size with.")
+parser.add_argument('-tracemalloc', action='store_true', help="Measure peak of memory allocated by Python and NumPy with tracemalloc too, implies -mem. Slows execution down significantly.")
 parser.add_argument('-i', dest="iterations", default=5, type=int, help="Number of iterations to run every benchmark. Best result is selected.")
 
 parser.add_argument("-db-server", default="localhost", help="Host name of MySQL server")
@@ -326,11 +1011,52 @@ if args.df <= 0:
 if args.iterations < 1:
     print("Bad number of iterations specified", args.t)
 
+if args.tracemalloc or args.stages:
+    args.mem = True
+
+if args.stage_cache is not None and args.iterations > 1:
+    print("Stage cache can be used only with single iteration, -i 1, because later iterations would load all stages from cache")
+    sys.exit(1)
+
+if args.workers is not None and args.workers < 1:
+    print("Bad number of workers specified", args.workers)
+    sys.exit(1)
+
+if args.partitions is not None and args.partitions < 1:
+    print("Bad number of partitions specified", args.partitions)
+    sys.exit(1)
+
+if args.partitions is not None and args.workers is not None:
+    print("Partitioned feature stages cannot be run by worker processes")
+    sys.exit(1)
+
+if args.kernels == 'numba' and args.mon12 != 'loop':
+    print("12 month features are computed by Numba kernel, -mon12 can be used only with -kernels both")
+    sys.exit(1)
+
+if (args.workers is not None or args.partitions is not None) and args.engine != 'pandas':
+    print("Worker processes are supported only by pandas engine")
+    sys.exit(1)
+
+if args.kernels != 'pandas':
+    try:
+        import numba
+    except ImportError:
+        print("Numba kernels require numba package")
+        sys.exit(1)
+    ever_delinq_kernel = numba.njit(cache=True)(ever_delinq_kernel)
+    loan_12_mon_kernel = numba.njit(cache=True)(loan_12_mon_kernel)
+    warm_up_kernels()
+
+if args.engine == 'modin':
+    os.environ["MODIN_ENGINE"] = args.modin_engine.capitalize()
+    import modin.pandas as pd
+
 db_reporter = None
 if args.db_user is not "":
     print("Connecting to database")
     db = mysql.connector.connect(host=args.db_server, port=args.db_port, user=args.db_user, passwd=args.db_pass, db=args.db_name);
-    db_reporter = report.DbReport(db, args.db_table, {
+    db_fields = {
         'FilesNumber': 'INT UNSIGNED NOT NULL',
         'FragmentSize': 'BIGINT UNSIGNED NOT NULL',
         'BenchName': 'VARCHAR(500) NOT NULL',
@@ -340,13 +1066,30 @@ if args.db_user is not "":
         'WorstTotalTimeMS': 'BIGINT UNSIGNED',
         'AverageExecTimeMS': 'BIGINT UNSIGNED',
         'AverageTotalTimeMS': 'BIGINT UNSIGNED'
-    }, {
+    }
+    if args.mem:
+        db_fields['PeakRSSMB'] = 'DOUBLE'
+        db_fields['DeltaRSSMB'] = 'DOUBLE'
+    if args.tracemalloc:
+        db_fields['TracedPeakMB'] = 'DOUBLE'
+    if args.workers is not None:
+        db_fields['Workers'] = 'INT UNSIGNED'
+        db_fields['CPUTimeMS'] = 'DOUBLE'
+        db_fields['CPUWallRatio'] = 'DOUBLE'
+    if args.stages:
+        db_fields['StageCPUTimeMS'] = 'DOUBLE'
+        db_fields['StageRows'] = 'BIGINT UNSIGNED'
+        db_fields['StageOutputMB'] = 'DOUBLE'
+    db_reporter = report.DbReport(db, args.db_table, db_fields, {
         'ScriptName': 'mortgage_pandas.py',
         'CommitHash': args.commit
     })
 
 data_directory = args.dp
-benchName = "mortgage_pandas"
+if args.prune:
+    perf_columns = perf_workflow_columns
+    acq_columns = acq_workflow_columns
+benchName = "mortgage_" + args.engine
 
 perf_data_path = os.path.join(data_directory, "perf")
 perf_format_path = os.path.join(perf_data_path, "Performance_%sQ%s.txt")
@@ -357,10 +1100,31 @@ worstTotalTime = 0
 avgExecTime = 0
 avgTotalTime = 0
 
+workflowMemory = dict.fromkeys(['peak_rss', 'delta_rss', 'traced_peak'])
+# Best exec and total time of every performance file when it is run by worker processes
+quarterBestExecTimes = {}
+quarterBestTotalTimes = {}
+# Sum of CPU times of performance files and its ratio to wall time in
+# iteration with best total time when they are run by worker processes
+cpuTime = None
+cpuWallRatio = None
+
+pool = None
+if args.workers is not None:
+    shared_names = pd_load_names()
+    pool = concurrent.futures.ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("fork"))
+
 for iii in range(1, args.iterations + 1):
     dataFilesNumber = 0
+    stage_times.clear()
+    stage_cpu_times.clear()
+    stage_rows.clear()
+    stage_output_mb.clear()
+    stage_cached.clear()
+    rss_start = memory.current_rss()
     time_ETL = time.time()
     exec_time_total = 0
+    tasks = []
     print("RUNNING BENCHMARK NUMBER", benchName, "ITERATION NUMBER", iii)
     for quarter in range(0, args.df):
         year = 2000 + quarter // 4
@@ -368,12 +1132,48 @@ for iii in range(1, args.iterations + 1):
 
         files = [f for f in pathlib.Path(perf_data_path).iterdir() if f.match('Performance_%sQ%s.txt*' % (str(year), str(quarter % 4 + 1)))]
         for f in files:
-            dataframe, exec_time = run_pd_workflow(year = year, quarter = (quarter % 4 + 1), perf_file = str(f))
-            exec_time_total += exec_time
+            if pool is None:
+                dataframe, exec_time = run_pd_workflow(year = year, quarter = (quarter % 4 + 1), perf_file = str(f))
+                exec_time_total += exec_time
+            else:
+                tasks.append((str(f), pool.submit(run_quarter, year, quarter % 4 + 1, str(f))))
         dataFilesNumber += 1
+    cpu_time_total = 0
+    for perf_file, future in tasks:
+        exec_time, total_time, cpu_time, statistics, loads = future.result()
+        for load_name, load in loads.items():
+            record_load(load_name, load)
+        name = os.path.basename(perf_file)
+        print("PERFORMANCE FILE", name, "EXEC TIME", exec_time, "TOTAL TIME", total_time)
+        cpu_time_total += cpu_time
+        quarterBestExecTimes[name] = min(quarterBestExecTimes.get(name, float("inf")), exec_time)
+        quarterBestTotalTimes[name] = min(quarterBestTotalTimes.get(name, float("inf")), total_time)
+        combine_stage_statistics(stage_statistics, statistics, operator.add)
     time_ETL_end = time.time()
     ttt = (time_ETL_end - time_ETL) * 1000
+    if pool is not None:
+        # Performance files overlap in time, so sum of their exec times is
+        # not exec time of iteration
+        exec_time_total = ttt
     print("ITERATION", iii, "EXEC TIME: ", exec_time_total, "TOTAL TIME: ", ttt)
+    if pool is not None:
+        # Ratio of CPU time to wall time is number of busy cores, it is not
+        # speedup over serial run which isn't measured
+        print("ITERATION", iii, "CPU TIME", cpu_time_total, "CPU/WALL TIME RATIO", cpu_time_total / ttt)
+        if bestTotalTime > ttt:
+            cpuTime = cpu_time_total
+            cpuWallRatio = cpu_time_total / ttt
+    for stage, stage_time in stage_times.items():
+        stage_best_times[stage] = min(stage_best_times.get(stage, float("inf")), stage_time)
+    for stage, stage_cpu_time in stage_cpu_times.items():
+        stage_best_cpu_times[stage] = min(stage_best_cpu_times.get(stage, float("inf")), stage_cpu_time)
+    if args.mem:
+        for key in workflowMemory:
+            values = [usage[key] for usage in stage_memory.values() if usage[key] is not None]
+            if values:
+                workflowMemory[key] = max(values)
+        if pool is None:
+            workflowMemory['delta_rss'] = max(workflowMemory['delta_rss'] or 0, workflowMemory['peak_rss'] - rss_start)
 
     if bestExecTime > exec_time_total:
         bestExecTime = exec_time_total
@@ -389,30 +1189,142 @@ for iii in range(1, args.iterations + 1):
 avgExecTime /= args.iterations
 avgTotalTime /= args.iterations
 
+# Loads with all columns are measured after benchmark, so they don't affect
+# its times. Worker processes load files in parallel as in benchmark
+full_loads = {}
+if args.load_report is not None and args.prune:
+    if pool is None:
+        full_loads = {name: measure_full_load(load) for name, load in file_loads.items()}
+    else:
+        futures = {name: pool.submit(measure_full_load, load) for name, load in file_loads.items()}
+        full_loads = {name: future.result() for name, future in futures.items()}
+
+if pool is not None:
+    pool.shutdown()
+
+def format_mb(value):
+    return "%.1f" % value if value is not None else ""
+
+def report_result(report, name, times, memoryUsage, cpuTime=None, cpuWallRatio=None, stageCPUTime=None, stageRows=None, stageOutputSize=None, errorInfo=""):
+    bestExecTime, bestTotalTime, worstExecTime, worstTotalTime, avgExecTime, avgTotalTime = times
+    print(dataFilesNumber, ",",
+          0, ",",
+          name, ",",
+          bestExecTime, ",",
+          bestTotalTime, ",",
+          worstExecTime, ",",
+          worstTotalTime, ",",
+          avgExecTime, ",",
+          avgTotalTime, ",",
+          errorInfo, file=report, sep='', end='', flush=True)
+    if args.mem:
+        print(",", format_mb(memoryUsage['peak_rss']), ",", format_mb(memoryUsage['delta_rss']), file=report, sep='', end='', flush=True)
+    if args.tracemalloc:
+        print(",", format_mb(memoryUsage['traced_peak']), file=report, sep='', end='', flush=True)
+    if args.workers is not None:
+        print(",", args.workers, ",", round(cpuTime) if cpuTime is not None else "", ",", "%.2f" % cpuWallRatio if cpuWallRatio is not None else "",
+              file=report, sep='', end='', flush=True)
+    if args.stages:
+        print(",", stageCPUTime if stageCPUTime is not None else "", ",", stageRows if stageRows is not None else "",
+              ",", format_mb(stageOutputSize), file=report, sep='', end='', flush=True)
+    print('', file=report, flush=True)
+    if db_reporter is not None:
+        result = {
+            'FilesNumber': dataFilesNumber,
+            'FragmentSize': 0,
+            'BenchName': name,
+            'BestExecTimeMS': bestExecTime,
+            'BestTotalTimeMS': bestTotalTime,
+            'WorstExecTimeMS': worstExecTime,
+            'WorstTotalTimeMS': worstTotalTime,
+            'AverageExecTimeMS': avgExecTime,
+            'AverageTotalTimeMS': avgTotalTime}
+        if args.mem:
+            result['PeakRSSMB'] = memoryUsage['peak_rss']
+            result['DeltaRSSMB'] = memoryUsage['delta_rss']
+        if args.tracemalloc:
+            result['TracedPeakMB'] = memoryUsage['traced_peak']
+        if args.workers is not None:
+            result['Workers'] = args.workers
+            result['CPUTimeMS'] = cpuTime
+            result['CPUWallRatio'] = cpuWallRatio
+        if args.stages:
+            result['StageCPUTimeMS'] = stageCPUTime
+            result['StageRows'] = stageRows
+            result['StageOutputMB'] = stageOutputSize
+        db_reporter.submit(result)
+
 try:
     with open(args.r, "w") as report:
         print("BENCHMARK", benchName, "EXEC TIME", bestExecTime, "TOTAL TIME", bestTotalTime)
-        print("datafiles,fragment_size,query,query_exec_min,query_total_min,query_exec_max,query_total_max,query_exec_avg,query_total_avg,query_error_info", file=report, flush=True)
-        print(dataFilesNumber, ",",
-              0, ",",
-              benchName, ",",
-              bestExecTime, ",",
-              bestTotalTime, ",",
-              worstExecTime, ",",
-              worstTotalTime, ",",
-              avgExecTime, ",",
-              avgTotalTime, ",",
-              "", '\n', file=report, sep='', end='', flush=True)
-        if db_reporter is not None:
-            db_reporter.submit({
-                'FilesNumber': dataFilesNumber,
-                'FragmentSize': 0,
-                'BenchName': benchName,
-                'BestExecTimeMS': bestExecTime,
-                'BestTotalTimeMS': bestTotalTime,
-                'WorstExecTimeMS': worstExecTime,
-                'WorstTotalTimeMS': worstTotalTime,
-                'AverageExecTimeMS': avgExecTime,
-                'AverageTotalTimeMS': avgTotalTime})
+        print("datafiles,fragment_size,query,query_exec_min,query_total_min,query_exec_max,query_total_max,query_exec_avg,query_total_avg,query_error_info", file=report, end='', flush=True)
+        if args.mem:
+            print(",peak_rss_mb,delta_rss_mb", file=report, end='', flush=True)
+        if args.tracemalloc:
+            print(",traced_peak_mb", file=report, end='', flush=True)
+        if args.workers is not None:
+            print(",workers,cpu_time_ms,cpu_wall_ratio", file=report, end='', flush=True)
+        if args.stages:
+            print(",stage_cpu_ms,stage_rows,stage_output_mb", file=report, end='', flush=True)
+        print('', file=report, flush=True)
+        report_result(report, benchName,
+                      [bestExecTime, bestTotalTime, worstExecTime, worstTotalTime, avgExecTime, avgTotalTime],
+                      workflowMemory, cpuTime, cpuWallRatio,
+                      errorInfo="%d stage runs loaded from cache" % sum(stage_cached.values()) if stage_cached else "")
+        # Performance files are reported with their best times over iterations
+        for name in quarterBestExecTimes:
+            report_result(report, benchName + ":" + name,
+                          [quarterBestExecTimes[name], quarterBestTotalTimes[name]] * 3,
+                          dict.fromkeys(['peak_rss', 'delta_rss', 'traced_peak']))
+        if args.mem or args.mon12 == 'both' or args.kernels == 'both' or args.dates is not None:
+            # Stages are reported with their best wall and CPU time over iterations
+            # and rows and size of their output in the last iteration
+            for stage, stage_time in stage_best_times.items():
+                usage = stage_memory.get(stage, dict.fromkeys(['peak_rss', 'delta_rss', 'traced_peak']))
+                cached = "loaded from cache" if stage in stage_cached else ""
+                print("STAGE", stage, "TIME", stage_time, "CPU TIME", stage_best_cpu_times.get(stage), "ROWS", stage_rows.get(stage),
+                      "OUTPUT MB", format_mb(stage_output_mb.get(stage)),
+                      "PEAK RSS MB", format_mb(usage['peak_rss']), "DELTA RSS MB", format_mb(usage['delta_rss']),
+                      "TRACED PEAK MB", format_mb(usage['traced_peak']), cached.upper())
+                report_result(report, benchName + ":" + stage, [stage_time] * 6, usage,
+                              stageCPUTime=stage_best_cpu_times.get(stage), stageRows=stage_rows.get(stage),
+                              stageOutputSize=stage_output_mb.get(stage), errorInfo=cached)
+            if args.mon12 == 'both':
+                print("create_12_mon_features_vectorized SPEEDUP",
+                      stage_best_times['create_12_mon_features'] / stage_best_times['create_12_mon_features_vectorized'])
+            if args.kernels == 'both':
+                # Numba stage of ever and delinquency features replaces three pandas stages
+                print("create_ever_delinq_features_numba SPEEDUP",
+                      sum(stage_best_times[stage] for stage in ['create_ever_features', 'create_delinq_features', 'join_ever_delinq_features']) /
+                      stage_best_times['create_ever_delinq_features_numba'])
+                pandas_12_mon_stage = 'create_12_mon_features_vectorized' if args.mon12 == 'vectorized' else 'create_12_mon_features'
+                print("create_12_mon_features_numba SPEEDUP",
+                      stage_best_times[pandas_12_mon_stage] / stage_best_times['create_12_mon_features_numba'])
 except IOError as err:
     print("Failed writing report file", args.r, err)
+
+if args.load_report is not None:
+    try:
+        with open(args.load_report, "w") as report:
+            print("file,columns,perf_parse_ms,perf_memory_mb,acq_parse_ms,acq_memory_mb", file=report, end='', flush=True)
+            if args.prune:
+                print(",perf_parse_saved_ms,perf_memory_saved_mb,acq_parse_saved_ms,acq_memory_saved_mb", file=report, end='', flush=True)
+            print('', file=report, flush=True)
+            for name, load in file_loads.items():
+                print("LOAD", name, "PERFORMANCE PARSE TIME", load['perf_parse_ms'], "MEMORY MB", format_mb(load['perf_memory_mb']),
+                      "ACQUISITION PARSE TIME", load['acq_parse_ms'], "MEMORY MB", format_mb(load['acq_memory_mb']))
+                print(name, "pruned" if args.prune else "all",
+                      int(round(load['perf_parse_ms'])), format_mb(load['perf_memory_mb']),
+                      int(round(load['acq_parse_ms'])), format_mb(load['acq_memory_mb']),
+                      sep=',', file=report, end='', flush=True)
+                if args.prune:
+                    perf_time, perf_memory, acq_time, acq_memory = full_loads[name]
+                    print("LOAD", name, "SAVED BY PRUNING PERFORMANCE PARSE TIME", perf_time - load['perf_parse_ms'],
+                          "MEMORY MB", format_mb(perf_memory - load['perf_memory_mb']),
+                          "ACQUISITION PARSE TIME", acq_time - load['acq_parse_ms'], "MEMORY MB", format_mb(acq_memory - load['acq_memory_mb']))
+                    print("", int(round(perf_time - load['perf_parse_ms'])), format_mb(perf_memory - load['perf_memory_mb']),
+                          int(round(acq_time - load['acq_parse_ms'])), format_mb(acq_memory - load['acq_memory_mb']),
+                          sep=',', file=report, end='', flush=True)
+                print('', file=report, flush=True)
+    except IOError as err:
+        print("Failed writing report file", args.load_report, err)
@@ -102,6 +102,8 @@ class DbReport:
         self.__database = database
 
     def __quote_string(self, n):
+        if n is None:
+            return 'NULL'
         if type(n) is str:
             return "'" + n + "'"
         elif type(n) is float:
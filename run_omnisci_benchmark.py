@@ -4,6 +4,7 @@ import subprocess
 import threading
 import argparse
 import pathlib
+import tempfile
 import signal
 import glob
 import time
@@ -23,17 +24,65 @@ def execute_process(cmdline, cwd=None):
     if process.returncode != 0:
         raise Exception("Command returned {}".format(process.returncode))
 
+def execute_omnisql(commands):
+    try:
+        process = subprocess.Popen(omnisql_cmdline, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
+        print(process.communicate(commands.encode())[0].strip().decode())
+    except OSError as err:
+        print("Failed to start", omnisql_cmdline, err)
+
+def clear_server_cache():
+    "Clear server CPU memory so that next query runs with cold cache"
+    execute_omnisql("\\clear_cpu\n")
+
+def execute_cold_benchmark(benchmark_cwd, benchmark_cmdline, results_file_name):
+    "Run every query alone right after clearing server cache and return list of its first run times by query name"
+    cold_results = {}
+    for query_file in sorted(os.listdir(args.queries_dir)):
+        with tempfile.TemporaryDirectory() as query_dir:
+            os.symlink(os.path.join(args.queries_dir, query_file), os.path.join(query_dir, query_file))
+            cold_cmdline = copy.copy(benchmark_cmdline)
+            cold_cmdline[cold_cmdline.index('-d') + 1] = query_dir
+            cold_cmdline[cold_cmdline.index('-i') + 1] = '2'
+            for iteration in range(1, args.iterations + 1):
+                print("RUNNING COLD CACHE QUERY", query_file, "ITERATION NUMBER", iteration)
+                clear_server_cache()
+                execute_process(cold_cmdline, cwd=benchmark_cwd)
+                with open(results_file_name, "r") as results_file:
+                    results = json.load(results_file)
+                for result in results:
+                    cold_results.setdefault(result['name'], []).append((result['results']['query_exec_first'],
+                                                                        result['results']['query_total_first']))
+    return cold_results
+
 def execute_benchmark(datafiles, import_cmdline, benchmark_cwd, benchmark_cmdline, fragment_size, results_file_name, report):
+    global staging_table_imported
     if import_cmdline is not None:
         ic = copy.copy(import_cmdline)
         # Import dataset mode
-        if fragment_size is not None:
-            ic += ['--fragment-size', str(fragment_size)]
+        if fragment_size is not None and args.staging:
+            # Import data only once into staging table, table with
+            # required fragment size is created as a copy of it
+            if not staging_table_imported:
+                ic[ic.index('-t') + 1] = staging_table_name
+                # Templated schema requires fragment size, staging table
+                # is created with the first one
+                ic += ['--fragment-size', str(fragment_size)]
+                print('STAGING IMPORT COMMAND LINE:', ic)
+                execute_process(ic)
+                staging_table_imported = True
+            print("CREATING TABLE", args.import_table_name, "WITH FRAGMENT SIZE", fragment_size, "FROM STAGING TABLE")
+            execute_omnisql("DROP TABLE IF EXISTS %s;\nCREATE TABLE %s AS (SELECT * FROM %s) WITH (FRAGMENT_SIZE=%d);\n" %
+                            (args.import_table_name, args.import_table_name, staging_table_name, fragment_size))
             fs = fragment_size
         else:
-            fs = 0
-        print('IMPORT COMMAND LINE:', ic)
-        execute_process(ic)
+            if fragment_size is not None:
+                ic += ['--fragment-size', str(fragment_size)]
+                fs = fragment_size
+            else:
+                fs = 0
+            print('IMPORT COMMAND LINE:', ic)
+            execute_process(ic)
     else:
         # Synthetic benchmark mode
         benchmark_cmdline += ['--fragment_size', str(fragment_size)]
@@ -46,7 +95,13 @@ def execute_benchmark(datafiles, import_cmdline, benchmark_cwd, benchmark_cmdlin
     # Parse report
     with open(results_file_name, "r") as results_file:
         results = json.load(results_file)
+    cold_results = {}
+    if args.cold:
+        cold_results = execute_cold_benchmark(benchmark_cwd, benchmark_cmdline, results_file_name)
+    total_exec_time = 0
     for result in results:
+        exec_time = result['results']['query_exec_min']
+        total_exec_time += exec_time if isinstance(exec_time, (int, float)) else float("inf")
         print(datafiles, ",",
               fs, ",",
               result['name'], ",",
@@ -56,10 +111,25 @@ def execute_benchmark(datafiles, import_cmdline, benchmark_cwd, benchmark_cmdlin
               result['results']['query_total_max'], ",",
               result['results']['query_exec_avg'], ",",
               result['results']['query_total_avg'], ",",
-              result['results']['query_error_info'], '\n',
+              result['results']['query_error_info'],
               file=report, sep='', end='', flush=True)
+        cold_values = {}
+        if args.cold:
+            cold_times = cold_results.get(result['name'], [(float("inf"), float("inf"))])
+            cold_values = {
+                'BestExecColdTimeMS': min(t[0] for t in cold_times),
+                'BestTotalColdTimeMS': min(t[1] for t in cold_times),
+                'AverageExecColdTimeMS': sum(t[0] for t in cold_times) / len(cold_times),
+                'AverageTotalColdTimeMS': sum(t[1] for t in cold_times) / len(cold_times)
+            }
+            print(",", cold_values['BestExecColdTimeMS'], ",",
+                  cold_values['BestTotalColdTimeMS'], ",",
+                  cold_values['AverageExecColdTimeMS'], ",",
+                  cold_values['AverageTotalColdTimeMS'],
+                  file=report, sep='', end='', flush=True)
+        print(file=report, flush=True)
         if db_reporter is not None:
-            db_reporter.submit({
+            db_reporter.submit(dict({
                 'FilesNumber': datafiles,
                 'FragmentSize': fs,
                 'BenchName': result['name'],
@@ -69,16 +139,20 @@ def execute_benchmark(datafiles, import_cmdline, benchmark_cwd, benchmark_cmdlin
                 'WorstTotalTimeMS': result['results']['query_total_max'],
                 'AverageExecTimeMS': str(result['results']['query_exec_avg']),
                 'AverageTotalTimeMS': result['results']['query_total_avg']
-            })
+            }, **cold_values))
+    return total_exec_time
 
 def print_omnisci_output(stdout):
     for line in iter(stdout.readline, b''):
         print("OMNISCI>>", line.decode().strip())
 
-# Load database reporting functions
+# Load database reporting and fragment size tuning functions
 pathToReportDir = os.path.join(pathlib.Path(__file__).parent, "report")
+pathToTuneDir = os.path.join(pathlib.Path(__file__).parent, "tune")
 sys.path.insert(1, pathToReportDir)
+sys.path.insert(1, pathToTuneDir)
 import report
+import tune
 
 parser = argparse.ArgumentParser(description='Run arbitrary omnisci benchmark and submit report values to MySQL database')
 optional = parser._action_groups.pop()
@@ -116,6 +190,12 @@ required.add_argument("-m", "--mode", dest="mode", choices=['synthetic', 'datase
 # Fragment size
 optional.add_argument('-fs', '--fragment-size', dest="fragment_size", action='append', type=int,
                       help="Fragment size to use for created table. Multiple values are allowed and encouraged. If no -fs switch is specified, default fragment size is used and templated CREATE TABLE sql files cannot be used.")
+optional.add_argument('-fs-tune', '--fragment-size-tune', dest="fragment_size_tune", nargs=2, type=int, metavar=('MIN', 'MAX'),
+                      help="Instead of using -fs values search for fragment size with the smallest sum of best query exec times between MIN and MAX. Golden-section search on logarithmic scale is used, so every probed fragment size costs one full benchmark run.")
+optional.add_argument('-fs-tune-threshold', '--fragment-size-tune-threshold', dest="fragment_size_tune_threshold", default=0.01, type=float,
+                      help="Fragment size search stops when total exec time improves by less than this fraction twice in a row.")
+optional.add_argument('-fs-tune-report', '--fragment-size-tune-report', dest="fragment_size_tune_report", default="report_fs_tune.csv",
+                      help="Fragment size search report file name, contains total exec time for every probed fragment size.")
 
 # Required for synthetic benchmarks
 optional.add_argument("-nf", "--num-fragments", dest="num_synthetic_fragments",
@@ -131,6 +211,11 @@ optional.add_argument("-c", "--table-schema-file", dest="table_schema_file",
 optional.add_argument("-d", "--queries-dir", dest="queries_dir",
                       help='Absolute path to dir with query files.')
 
+optional.add_argument("-staging", dest="staging", action='store_true',
+                      help="In dataset mode import data only once into a staging table and create table for every fragment size as its copy with CREATE TABLE AS SELECT instead of importing data files again.")
+optional.add_argument("-cold", dest="cold", action='store_true',
+                      help="Also measure cold cache query times in dataset mode. Every query is run alone right after clearing server CPU memory, --iterations times. Best and average cold times are added to the report.")
+
 # MySQL database parameters
 optional.add_argument("-db-server", default="localhost", help="Host name of MySQL server.")
 optional.add_argument("-db-port", default=3306, type=int, help="Port number of MySQL server.")
@@ -212,10 +297,22 @@ synthetic_benchmark_cmdline = ['python3',
                                '--gpu_label', 'CPU',
                                '--result_dir', 'synthetic_results']
 
+staging_table_name = args.import_table_name + "_staging"
+staging_table_imported = False
+
+omnisql_cmdline = [os.path.join(pathlib.Path(args.omnisci_executable).parent, "omnisql"),
+                   '-q', args.name,
+                   '-u', args.user,
+                   '-p', args.passwd,
+                   '--port', str(args.omnisci_port)]
+
 if args.mode == 'synthetic':
-    if args.synthetic_query is None or args.num_synthetic_fragments is None or args.fragment_size is None:
+    if args.synthetic_query is None or args.num_synthetic_fragments is None or (args.fragment_size is None and args.fragment_size_tune is None):
         print("For synthetic type of benchmark the following parameters are mandatory: --synthetic-query, --num-fragments and --fragment-size.")
         sys.exit(3)
+    if args.cold:
+        print("Cold cache measurement is supported only for dataset type of benchmark.")
+        sys.exit(3)
     datafiles = 0
     results_file_name = os.path.join(args.benchmarks_path, 'synthetic_results', args.label, 'CPU', 'Benchmarks', args.synthetic_query + '.json')
     import_cmdline = None
@@ -239,7 +336,7 @@ if args.db_user is not "":
         sys.exit(4)
     print("CONNECTING TO DATABASE")
     db = mysql.connector.connect(host=args.db_server, port=args.db_port, user=args.db_user, passwd=args.db_pass, db=args.db_name);
-    db_reporter = report.DbReport(db, args.db_table, {
+    db_fields = {
         'FilesNumber': 'INT UNSIGNED NOT NULL',
         'FragmentSize': 'BIGINT UNSIGNED NOT NULL',
         'BenchName': 'VARCHAR(500) NOT NULL',
@@ -249,7 +346,15 @@ if args.db_user is not "":
         'WorstTotalTimeMS': 'BIGINT UNSIGNED',
         'AverageExecTimeMS': 'BIGINT UNSIGNED',
         'AverageTotalTimeMS': 'BIGINT UNSIGNED'
-    }, {
+    }
+    if args.cold:
+        db_fields.update({
+            'BestExecColdTimeMS': 'BIGINT UNSIGNED',
+            'BestTotalColdTimeMS': 'BIGINT UNSIGNED',
+            'AverageExecColdTimeMS': 'BIGINT UNSIGNED',
+            'AverageTotalColdTimeMS': 'BIGINT UNSIGNED'
+        })
+    db_reporter = report.DbReport(db, args.db_table, db_fields, {
         'ScriptName': 'run_omnisci_benchmark.py',
         'CommitHash': args.commit
     })
@@ -269,8 +374,25 @@ try:
     time.sleep(5)
 
     with open(args.report, "w") as report:
-        print("datafiles,fragment_size,query,query_exec_min,query_total_min,query_exec_max,query_total_max,query_exec_avg,query_total_avg,query_error_info", file=report, flush=True)
-        if args.fragment_size is not None:
+        print("datafiles,fragment_size,query,query_exec_min,query_total_min,query_exec_max,query_total_max,query_exec_avg,query_total_avg,query_error_info",
+              file=report, sep='', end='', flush=True)
+        if args.cold:
+            print(",query_exec_cold_min,query_total_cold_min,query_exec_cold_avg,query_total_cold_avg", file=report, sep='', end='', flush=True)
+        print(file=report, flush=True)
+        if args.fragment_size_tune is not None:
+            best_fs, curve = tune.tune_fragment_size(
+                lambda fs: execute_benchmark(datafiles, import_cmdline, args.benchmarks_path,
+                                             copy.copy(benchmark_cmdline), fs, results_file_name, report),
+                args.fragment_size_tune[0], args.fragment_size_tune[1], args.fragment_size_tune_threshold)
+            if best_fs is None:
+                print("FRAGMENT SIZE TUNING FAILED, BENCHMARK FAILED FOR ALL PROBED FRAGMENT SIZES")
+            else:
+                print("BEST FRAGMENT SIZE", best_fs, "TOTAL EXEC TIME", dict(curve)[best_fs])
+            with open(args.fragment_size_tune_report, "w") as tune_report:
+                print("fragment_size,total_exec_time", file=tune_report, flush=True)
+                for fs, total_exec_time in curve:
+                    print(fs, ",", total_exec_time, '\n', file=tune_report, sep='', end='', flush=True)
+        elif args.fragment_size is not None:
             for fs in args.fragment_size:
                 print("RUNNING WITH FRAGMENT SIZE", fs)
                 execute_benchmark(datafiles, import_cmdline, args.benchmarks_path,
@@ -280,6 +402,9 @@ try:
             execute_benchmark(datafiles, import_cmdline, args.benchmarks_path,
                               benchmark_cmdline, None, results_file_name, report)
 finally:
+    if args.staging and import_cmdline is not None:
+        print("DROPPING STAGING TABLE", staging_table_name)
+        execute_omnisql("DROP TABLE IF EXISTS %s;\n" % staging_table_name)
     print("TERMINATING SERVER")
     server_process.send_signal(signal.SIGINT)
     time.sleep(2)
@@ -1,11 +1,14 @@
 import glob
 import os
 import pathlib
+import queue
+import re
 import signal
 import sys
 import subprocess
 import threading
 import time
+from pymapd import connect
 
 path_to_ibis_dir = os.path.join(pathlib.Path(__file__).parent.parent, "..", "ibis/build/lib")
 sys.path.insert(1, path_to_ibis_dir)
@@ -19,6 +22,7 @@ class Omnisci_server:
     _calcite_port = 62279
     _server_process = None
     _command_2_import_CSV = "COPY trips FROM '%s' WITH (header='false');"
+    _loaded_rows_regexp = re.compile("Loaded: (\\d+) recs", flags=re.MULTILINE)
 
     def __init__(self, omnisci_executable, omnisci_port, database_name, omnisci_cwd=None):
         if omnisci_cwd is not None:
@@ -36,6 +40,7 @@ class Omnisci_server:
             _ = self._execute_process([self._initdb_executable, '-f', '--data', self._data_dir])
 
         self._server_port = omnisci_port
+        self._database_name = database_name
         self._omnisci_server_executable = os.path.join(pathlib.Path(omnisci_executable).parent, "omnisci_server")
         self._server_start_cmdline = [self._omnisci_server_executable,
                                     "data",
@@ -82,21 +87,81 @@ class Omnisci_server:
 
         print("SERVER IS TERMINATED")
 
-    def import_data(self, data_files_names, files_limit):
-        "Import CSV files using COPY SQL statement"
-
-        for f in data_files_names[:files_limit]:
-            print("Importing datafile", f)
-            copy_str = self._command_2_import_CSV % f
-
-            try:
-                import_process = subprocess.Popen(self._omnisci_cmd_line, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
-                output = import_process.communicate(copy_str.encode())
-            except OSError as err:
-                print("Failed to start", self._omnisci_cmd_line, err)
-
-            print(str(output[0].strip().decode()))
-            print("Command returned", import_process.returncode)
+    def _import_file_stats(self, file_name, output, import_time):
+        "Print and return import speed of one file calculated from COPY statement output"
+
+        matches = re.search(self._loaded_rows_regexp, output)
+        rows = int(matches.group(1)) if matches is not None else 0
+        size_mb = os.path.getsize(file_name) / 1024 / 1024 if os.path.isfile(file_name) else 0
+        stats = {
+            'file': file_name,
+            'rows': rows,
+            'time_ms': int(round(import_time * 1000)),
+            'rows_per_sec': rows / import_time if import_time > 0 else 0,
+            'mb_per_sec': size_mb / import_time if import_time > 0 else 0
+        }
+        print("Imported datafile", file_name, "rows", rows, "time ms", stats['time_ms'],
+              "rows/s", int(stats['rows_per_sec']), "MB/s", round(stats['mb_per_sec'], 2))
+        return stats
+
+    def _import_worker(self, files_queue, files_stats):
+        "Import files from queue using own connection until queue is empty"
+
+        connection = connect(user="admin", password="HyperInteractive", host="localhost",
+                             dbname=self._database_name, port=self._server_port)
+        try:
+            while True:
+                try:
+                    f = files_queue.get_nowait()
+                except queue.Empty:
+                    break
+                print("Importing datafile", f)
+                t = time.time()
+                try:
+                    output = "\n".join(str(row[0]) for row in connection.execute(self._command_2_import_CSV % f))
+                except Exception as err:
+                    print("Failed to import", f, err)
+                    output = str(err)
+                files_stats.append(self._import_file_stats(f, output, time.time() - t))
+        finally:
+            connection.close()
+
+    def import_data(self, data_files_names, files_limit, workers=1):
+        "Import CSV files using COPY SQL statement, concurrently by several workers with their own connections if workers > 1. Return import time in ms"
+
+        files_stats = []
+        t_begin = time.time()
+        if workers > 1:
+            files_queue = queue.Queue()
+            for f in data_files_names[:files_limit]:
+                files_queue.put(f)
+            print("Importing", files_queue.qsize(), "datafiles with", workers, "workers")
+            import_threads = [threading.Thread(target=self._import_worker, args=(files_queue, files_stats))
+                              for _ in range(workers)]
+            for t in import_threads:
+                t.start()
+            for t in import_threads:
+                t.join()
+        else:
+            for f in data_files_names[:files_limit]:
+                print("Importing datafile", f)
+                copy_str = self._command_2_import_CSV % f
+
+                t = time.time()
+                try:
+                    import_process = subprocess.Popen(self._omnisci_cmd_line, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
+                    output = import_process.communicate(copy_str.encode())
+                except OSError as err:
+                    print("Failed to start", self._omnisci_cmd_line, err)
+
+                print(str(output[0].strip().decode()))
+                print("Command returned", import_process.returncode)
+                files_stats.append(self._import_file_stats(f, str(output[0].decode()), time.time() - t))
+
+        import_time = int(round((time.time() - t_begin) * 1000))
+        total_rows = sum(stats['rows'] for stats in files_stats)
+        print("IMPORT TIME MS", import_time, "ROWS", total_rows)
+        return import_time
 
     def connect_to_server(self):
         "Connect to Omnisci server using Ibis framework"
@@ -7,13 +7,17 @@ import (
 	"io"
 	"log"
 	"math"
+	"math/bits"
+	"math/rand"
 	"os"
 	"os/exec"
 	"path/filepath"
 	"regexp"
 	"strconv"
 	"strings"
+	"sync"
 	"text/template"
+	"time"
 )
 
 const (
@@ -84,6 +88,24 @@ func (af *arrayFlags) Set(value string) error {
 
 var myFlags arrayFlags
 
+type rateFlags []float64
+
+func (rf *rateFlags) String() string {
+	return fmt.Sprint(*rf)
+}
+
+func (rf *rateFlags) Set(value string) error {
+	fval, err := strconv.ParseFloat(value, 64)
+	if err != nil {
+		return err
+	}
+	if fval <= 0 {
+		return fmt.Errorf("rate should be positive: %s", value)
+	}
+	*rf = append(*rf, fval)
+	return nil
+}
+
 func main() {
 	var fragmentSizes arrayFlags
 	flag.Var(&fragmentSizes, "fs", "Fragment size to use for created table. Multiple values are allowed and encouraged.")
@@ -99,6 +121,11 @@ func main() {
 	repFile := flag.String("r", "report.csv", "Report file name")
 	testme := flag.Bool("test", false, "Run tests")
 	serverPort := flag.Int("port", 62074, "TCP port to use to connect to server")
+	var openLoopRates rateFlags
+	flag.Var(&openLoopRates, "olr", "Run open loop test instead of timing every query: send random benchmark queries with Poisson arrivals at this rate (queries per second). Multiple values are allowed and encouraged.")
+	openLoopConns := flag.Uint("olc", 8, "Number of persistent omnisql connections used by open loop test")
+	openLoopDuration := flag.Duration("old", time.Minute, "Duration of open loop test for every rate")
+	openLoopFile := flag.String("olf", "report_openloop.csv", "Open loop test report file name")
 	flag.Parse()
 
 	if *testme {
@@ -213,6 +240,13 @@ func main() {
 			}
 		}
 
+		if len(openLoopRates) > 0 {
+			if err := openLoop(*executable, fs, openLoopRates, *openLoopConns, *openLoopDuration, *openLoopFile); err != nil {
+				log.Fatal(err)
+			}
+			continue
+		}
+
 		// Benchmarks
 		for benchNumber, benchString := range benchmarksCode {
 			bestExecTime := uint64(math.MaxUint64)
@@ -266,6 +300,38 @@ func main() {
 	fileOut.Close()
 }
 
+func openLoop(executable string, fs uint64, rates rateFlags, conns uint, duration time.Duration, repFile string) error {
+	fileOut, err := os.OpenFile(repFile, os.O_APPEND|os.O_CREATE|os.O_WRONLY, 0644)
+	if err != nil {
+		return err
+	}
+	defer fileOut.Close()
+	if info, err := fileOut.Stat(); err == nil && info.Size() == 0 {
+		fmt.Fprintln(fileOut, "fragment_size,rate,query,queries_number,errors_number,achieved_rate,latency_p50_ms,latency_p90_ms,latency_p99_ms,latency_p999_ms,latency_max_ms")
+	}
+
+	pool := make([]*omnisqlConn, 0, conns)
+	defer func() {
+		for _, conn := range pool {
+			conn.close()
+		}
+	}()
+	for i := uint(0); i < conns; i++ {
+		conn, err := newOmnisqlConn(executable, omnisciCmdLine)
+		if err != nil {
+			return err
+		}
+		pool = append(pool, conn)
+	}
+
+	for _, rate := range rates {
+		fmt.Println("RUNNING OPEN LOOP TEST WITH RATE", rate, "QUERIES PER SECOND")
+		result := runOpenLoop(pool, rate, duration)
+		writeOpenLoopReport(fileOut, fs, rate, result)
+	}
+	return nil
+}
+
 func getErrorLine(buffer string) string {
 	matches := exceptionRegexp.FindStringSubmatch(buffer)
 	if len(matches) == 1 {
@@ -298,3 +364,214 @@ this is a test2
 	fmt.Println("test1:", getErrorLine(teststr1))
 	fmt.Println("test2:", getErrorLine(teststr2))
 }
+
+const (
+	// Query that separates output of consecutive queries in a persistent
+	// omnisql process. Timing is switched off for it so that its own
+	// timing line is not mixed with the next query output.
+	markerQuery = "\n\\notiming\nSELECT '%s';\n"
+
+	// Latency histogram keeps values below histogramSubBuckets exactly
+	// and splits every following power of two range into
+	// histogramSubBuckets/2 linear buckets, like HdrHistogram does. This
+	// gives about 1.5% relative error for any latency value.
+	histogramSubBuckets     = 128
+	histogramHalfSubBuckets = histogramSubBuckets / 2
+	histogramBuckets        = histogramSubBuckets + 57*histogramHalfSubBuckets
+)
+
+// omnisqlConn is omnisql process that is kept running between queries
+type omnisqlConn struct {
+	cmd     *exec.Cmd
+	stdin   io.WriteCloser
+	stdout  *bufio.Reader
+	queries uint64
+}
+
+func newOmnisqlConn(executable string, args []string) (*omnisqlConn, error) {
+	cmd := exec.Command(executable, args...)
+	stdin, err := cmd.StdinPipe()
+	if err != nil {
+		return nil, err
+	}
+	stdout, err := cmd.StdoutPipe()
+	if err != nil {
+		return nil, err
+	}
+	cmd.Stderr = cmd.Stdout
+	if err := cmd.Start(); err != nil {
+		return nil, err
+	}
+	return &omnisqlConn{cmd: cmd, stdin: stdin, stdout: bufio.NewReader(stdout)}, nil
+}
+
+// run sends query to omnisql process and returns its output
+func (c *omnisqlConn) run(query string) (string, error) {
+	c.queries++
+	marker := fmt.Sprintf("omnisql_query_%d_done", c.queries)
+	if _, err := io.WriteString(c.stdin, query+fmt.Sprintf(markerQuery, marker)); err != nil {
+		return "", err
+	}
+	var output strings.Builder
+	for {
+		line, err := c.stdout.ReadString('\n')
+		if strings.Contains(line, marker) {
+			return output.String(), nil
+		}
+		output.WriteString(line)
+		if err != nil {
+			return output.String(), err
+		}
+	}
+}
+
+func (c *omnisqlConn) close() {
+	c.stdin.Close()
+	c.cmd.Wait()
+}
+
+type latencyHistogram struct {
+	counts [histogramBuckets]uint64
+	total  uint64
+	max    uint64
+}
+
+func histogramIndex(value uint64) int {
+	if value < histogramSubBuckets {
+		return int(value)
+	}
+	shift := bits.Len64(value) - 7
+	top := value >> uint(shift)
+	return histogramSubBuckets + (shift-1)*histogramHalfSubBuckets + int(top-histogramHalfSubBuckets)
+}
+
+// histogramValue returns the highest value that falls into bucket
+func histogramValue(index int) uint64 {
+	if index < histogramSubBuckets {
+		return uint64(index)
+	}
+	shift := uint((index-histogramSubBuckets)/histogramHalfSubBuckets + 1)
+	top := uint64((index-histogramSubBuckets)%histogramHalfSubBuckets + histogramHalfSubBuckets)
+	return (top+1)<<shift - 1
+}
+
+func (h *latencyHistogram) record(value uint64) {
+	h.counts[histogramIndex(value)]++
+	h.total++
+	if value > h.max {
+		h.max = value
+	}
+}
+
+func (h *latencyHistogram) merge(other *latencyHistogram) {
+	for i, count := range other.counts {
+		h.counts[i] += count
+	}
+	h.total += other.total
+	if other.max > h.max {
+		h.max = other.max
+	}
+}
+
+func (h *latencyHistogram) percentile(p float64) uint64 {
+	if h.total == 0 {
+		return 0
+	}
+	target := uint64(math.Ceil(p / 100 * float64(h.total)))
+	if target == 0 {
+		target = 1
+	}
+	var seen uint64
+	for i, count := range h.counts {
+		seen += count
+		if seen >= target {
+			value := histogramValue(i)
+			if value > h.max {
+				return h.max
+			}
+			return value
+		}
+	}
+	return h.max
+}
+
+type openLoopRequest struct {
+	query    int
+	intended time.Time
+}
+
+type openLoopResult struct {
+	histograms []latencyHistogram
+	errors     []uint64
+	elapsed    time.Duration
+}
+
+// runOpenLoop sends random benchmark queries with Poisson arrivals at
+// given rate (queries per second) for duration. Latency of every query
+// is counted from the moment it was scheduled to arrive, not from the
+// moment a connection became free, so queueing delay is included and
+// coordinated omission doesn't hide server saturation.
+func runOpenLoop(pool []*omnisqlConn, rate float64, duration time.Duration) openLoopResult {
+	result := openLoopResult{
+		histograms: make([]latencyHistogram, len(benchmarksCode)),
+		errors:     make([]uint64, len(benchmarksCode)),
+	}
+	// Queue is large enough never to block arrivals generator
+	requests := make(chan openLoopRequest, int(rate*duration.Seconds())+1)
+	var mutex sync.Mutex
+	var wg sync.WaitGroup
+	for _, conn := range pool {
+		wg.Add(1)
+		go func(conn *omnisqlConn) {
+			defer wg.Done()
+			for req := range requests {
+				output, err := conn.run(benchmarksCode[req.query])
+				latency := time.Since(req.intended)
+				failed := err != nil || !timingRegexp.MatchString(output)
+				mutex.Lock()
+				if failed {
+					result.errors[req.query]++
+				} else {
+					result.histograms[req.query].record(uint64(latency / time.Microsecond))
+				}
+				mutex.Unlock()
+			}
+		}(conn)
+	}
+
+	start := time.Now()
+	deadline := start.Add(duration)
+	next := start
+	for {
+		next = next.Add(time.Duration(rand.ExpFloat64() / rate * float64(time.Second)))
+		if next.After(deadline) {
+			break
+		}
+		time.Sleep(time.Until(next))
+		requests <- openLoopRequest{query: rand.Intn(len(benchmarksCode)), intended: next}
+	}
+	close(requests)
+	wg.Wait()
+	result.elapsed = time.Since(start)
+	return result
+}
+
+func writeOpenLoopReport(out io.Writer, fs uint64, rate float64, result openLoopResult) {
+	var all latencyHistogram
+	var allErrors uint64
+	line := func(query string, h *latencyHistogram, errors uint64) {
+		ms := func(us uint64) float64 { return float64(us) / 1000 }
+		fmt.Fprintf(out, "%d,%g,%s,%d,%d,%.2f,%.3f,%.3f,%.3f,%.3f,%.3f\n", fs, rate, query, h.total, errors,
+			float64(h.total)/result.elapsed.Seconds(), ms(h.percentile(50)), ms(h.percentile(90)),
+			ms(h.percentile(99)), ms(h.percentile(99.9)), ms(h.max))
+	}
+	for query := range result.histograms {
+		line(fmt.Sprint(query+1), &result.histograms[query], result.errors[query])
+		all.merge(&result.histograms[query])
+		allErrors += result.errors[query]
+	}
+	line("all", &all, allErrors)
+	fmt.Printf("RATE %g achieved %.2f p50 %d us, p99 %d us, p99.9 %d us, errors %d\n", rate,
+		float64(all.total)/result.elapsed.Seconds(), all.percentile(50), all.percentile(99),
+		all.percentile(99.9), allErrors)
+}
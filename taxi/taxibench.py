@@ -1,8 +1,12 @@
+from pymapd import connect
 import mysql.connector
 import subprocess
+import threading
 import argparse
 import pathlib
 import glob
+import math
+import time
 import sys
 import re
 import io
@@ -11,14 +15,20 @@ import os
 # Load database reporting functions
 pathToReportDir = os.path.join(pathlib.Path(__file__).parent, "..", "report")
 print(pathToReportDir)
+pathToTuneDir = os.path.join(pathlib.Path(__file__).parent, "..", "tune")
 sys.path.insert(1, pathToReportDir)
+sys.path.insert(1, pathToTuneDir)
 import report
+import tune
 
 omnisciExecutable  = "build/bin/omnisql"
 taxiTripsDirectory = "/localdisk/work/trips_x*.csv"
 
 command1DropTableTrips = "drop table taxitestdb;"
 command2ImportCSV      = "COPY taxitestdb FROM '%s' WITH (header='false');"
+stagingTableName         = "taxitestdb_staging"
+command3DropStagingTable = "drop table if exists %s;" % stagingTableName
+command4CopyStagingTable = "CREATE TABLE taxitestdb AS (SELECT * FROM %s) WITH (FRAGMENT_SIZE=%%d);" % stagingTableName
 
 timingRegexpRegexp = re.compile("Execution time: (\d+) ms, Total time: (\d+) ms", flags=re.MULTILINE)
 exceptionRegexpRegexp = re.compile("Exception: .*", flags=re.MULTILINE)
@@ -191,6 +201,127 @@ def getErrorLine(text):
             errStr = line
     return errStr
 
+class OmnisqlSession:
+    "Run a sequence of statements in a single omnisql process and split its output per statement."
+
+    # Query that separates output of consecutive statements. Timing is
+    # switched off for it so that timing line of the next statement
+    # doesn't get mixed with the marker.
+    _marker = "omnisql_session_statement_%d_done"
+    _markerQuery = "\n\\notiming\nSELECT '%s';\n"
+
+    def __init__(self, cmdline):
+        self._cmdline = cmdline
+        self._statements = []
+
+    def add(self, statement):
+        self._statements.append(statement)
+
+    def size(self):
+        return len(self._statements)
+
+    def run(self):
+        script = ""
+        for number, statement in enumerate(self._statements):
+            script += statement + self._markerQuery % (self._marker % number)
+
+        output = ""
+        returnCode = None
+        try:
+            process = subprocess.Popen(self._cmdline, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
+            output = str(process.communicate(script.encode())[0].decode())
+            returnCode = process.returncode
+        except OSError as err:
+            print("Failed to start", self._cmdline, err)
+
+        # Output of statement number N is everything between markers N-1 and N.
+        # If omnisql stopped early, statements after that get its remaining output.
+        outputs = []
+        for number in range(len(self._statements)):
+            statementOutput, found, output = output.partition(self._marker % number)
+            outputs.append(statementOutput.strip())
+            if not found:
+                output = ""
+        self._statements = []
+        return returnCode, outputs
+
+def omnisqlBenchmarkCode(benchString, cacheMode):
+    "Return omnisql input for benchmark, cold cache benchmark clears server CPU memory first"
+
+    if cacheMode == 'cold':
+        return "\\clear_cpu\n" + benchString
+    return benchString
+
+def runBenchmarkPymapd(connection, benchString):
+    "Run benchmark query over Thrift connection and return timing reported by server"
+
+    query = benchString.replace("\\timing", "").strip().rstrip(";")
+    result = connection._client.sql_execute(session=connection._session, query=query, column_format=True,
+                                            nonce=None, first_n=-1, at_most_n=-1)
+    columns = result.row_set.columns
+    return {
+        'execTime': result.execution_time_ms,
+        'totalTime': result.total_time_ms,
+        'rows': len(columns[0].nulls) if columns else 0
+    }
+
+def percentile(values, p):
+    "Nearest-rank percentile of a list of values"
+
+    ordered = sorted(values)
+    return ordered[max(0, int(math.ceil(p / 100.0 * len(ordered))) - 1)]
+
+def throughputClient(clientNumber, port, stopTime, latencies, errors):
+    "Run benchmark queries one after another in a loop until stopTime using own connection"
+
+    connection = connect(user="admin", password="HyperInteractive", host="localhost", dbname="omnisci", port=port)
+    try:
+        # Clients start from different queries to avoid running the same query in lockstep
+        benchNumber = clientNumber % len(benchmarksCode)
+        while time.time() < stopTime:
+            t = time.time()
+            try:
+                runBenchmarkPymapd(connection, benchmarksCode[benchNumber])
+                latencies[benchNumber].append((time.time() - t) * 1000)
+            except Exception as err:
+                print("Client", clientNumber, "query", benchNumber + 1, "failed:", err)
+                errors[benchNumber] += 1
+            benchNumber = (benchNumber + 1) % len(benchmarksCode)
+    finally:
+        connection.close()
+
+def runThroughput(clients, port, duration):
+    "Run closed loop of concurrent clients for duration seconds and return QPS and latency percentiles for every query"
+
+    latencies = [[] for _ in benchmarksCode]
+    errors = [0 for _ in benchmarksCode]
+    stopTime = time.time() + duration
+    clientThreads = [threading.Thread(target=throughputClient, args=(n, port, stopTime, latencies, errors))
+                     for n in range(clients)]
+    tBegin = time.time()
+    for t in clientThreads:
+        t.start()
+    for t in clientThreads:
+        t.join()
+    elapsed = time.time() - tBegin
+
+    results = []
+    for benchNumber, queryLatencies in enumerate(latencies, start=1):
+        results.append({
+            'query': benchNumber,
+            'count': len(queryLatencies),
+            'errors': errors[benchNumber - 1],
+            'qps': len(queryLatencies) / elapsed,
+            'p50': percentile(queryLatencies, 50) if queryLatencies else float("inf"),
+            'p95': percentile(queryLatencies, 95) if queryLatencies else float("inf"),
+            'p99': percentile(queryLatencies, 99) if queryLatencies else float("inf")
+        })
+    return results
+
+def formatLatency(latency):
+    "Latency percentile for printing, it is infinite when query had no successful requests"
+    return "N/A" if math.isinf(latency) else int(latency)
+
 def testme():
     for benchNumber, benchString in enumerate(benchmarksCode, start=1):
         print(benchNumber, ":", getErrorLine(benchString))
@@ -222,13 +353,25 @@ this is a test3
 parser = argparse.ArgumentParser(description='Run NY Taxi benchmark using omnisql client')
 
 parser.add_argument('-fs', action='append', type=int, help="Fragment size to use for created table. Multiple values are allowed and encouraged.")
+parser.add_argument('-fst', nargs=2, type=int, metavar=('MIN', 'MAX'), help="Instead of using -fs values search for fragment size with the smallest sum of best benchmark exec times between MIN and MAX. Golden-section search on logarithmic scale is used, so every probed fragment size costs one table import.")
+parser.add_argument('-fstt', default=0.01, type=float, help="Fragment size search stops when total exec time improves by less than this fraction twice in a row")
+parser.add_argument('-fstr', default="report_fs_tune.csv", help="Fragment size search report file name, contains total exec time for every probed fragment size")
 parser.add_argument('-e', default=omnisciExecutable, help='Path to executable "omnisql"')
 parser.add_argument('-ct', action='store_true', help="Use CREATE TABLE WITH (STORAGE_TYPE='CSV:trips.csv'). KEEP IN MIND that currently it is possible to load JUST ONE CSV file with this statement, so join all data into one big file, so -df value has no effect.")
 parser.add_argument('-df', default=1, type=int, help="Number of datafiles to input into database for processing")
 parser.add_argument('-dp', default=taxiTripsDirectory, help="Wildcard pattern of datafiles that should be loaded")
+parser.add_argument('-staging', action='store_true', help="Import datafiles with COPY only once into staging table. Table for every fragment size is created as a copy of staging table with CREATE TABLE AS SELECT, so datafiles are not parsed again for every -fs value.")
 parser.add_argument('-dnd', action='store_true', help="Do not delete old table. KEEP IN MIND that in this case -fs values have no effect because table is taken from previous runs.")
 parser.add_argument('-dni', action='store_true', help="Do not create new table and import any data from CSV files. KEEP IN MIND that in this case -fs values have no effect because table is taken from previous runs.")
 parser.add_argument('-t', default=5, type=int, help="Number of times to run every benchmark. Best result is selected")
+parser.add_argument('-session', action='store_true', help="Use one omnisql process for every fragment size. All drop, create, import and benchmark statements are sent to it and timing is taken from its output for every statement, so process startup is not paid for every command.")
+parser.add_argument('-runner', default='omnisql', choices=['omnisql', 'pymapd'], help="Way to run benchmark queries. omnisql parses timing from omnisql client output, pymapd sends queries over Thrift connection and uses execution time, total time and number of result rows reported by server.")
+parser.add_argument('-cold', action='store_true', help="Also run every benchmark -t times with cold cache. Server CPU memory is cleared before every cold iteration. Best cold exec and total times are added to the report after warm ones.")
+parser.add_argument('-throughput', action='store_true', help="Instead of timing every query separately run closed loop throughput test. Concurrent clients with own connections run all benchmark queries in a loop. Number of clients is doubled starting from 1 until throughput stops growing.")
+parser.add_argument('-tpd', default=60, type=int, help="Duration of throughput test for every number of clients in seconds")
+parser.add_argument('-tpc', default=64, type=int, help="Maximum number of concurrent clients for throughput test")
+parser.add_argument('-tpt', default=5.0, type=float, help="Throughput is considered saturated when total QPS grows less than this number of percents after doubling number of clients")
+parser.add_argument('-tpr', default="report_throughput.csv", help="Throughput test report file name")
 parser.add_argument('-sco', action='store_true', help="Show commands (that delete and create table) output")
 parser.add_argument('-sbo', action='store_true', help="Show benchmarks output")
 parser.add_argument('-r', default="report.csv", help="Report file name")
@@ -252,39 +395,69 @@ if args.df <= 0:
     print("Bad number of data files specified", args.df)
     sys.exit(1)
 
+if args.fs is None and args.fst is None:
+    print("Either -fs or -fst should be specified")
+    sys.exit(1)
+
 if args.t < 1:
     print("Bad number of iterations specified", args.t)
 
 omnisciCmdLine = [args.e] + omnisciCmdLine + ["--port", str(args.port)]
 
+# Cold iterations clear server CPU memory before every query
+cacheModes = ['cold', 'warm'] if args.cold else ['warm']
+
 db_reporter = None
 if args.db_user is not "":
     print("Connecting to database")
     db = mysql.connector.connect(host=args.db_server, port=args.db_port, user=args.db_user, passwd=args.db_pass, db=args.db_name);
-    db_reporter = report.DbReport(db, "taxibench", {
+    db_fields = {
         'FilesNumber': 'INT UNSIGNED NOT NULL',
         'FragmentSize': 'BIGINT UNSIGNED NOT NULL',
         'BenchName': 'VARCHAR(500) NOT NULL',
         'BestExecTimeMS': 'BIGINT UNSIGNED',
         'BestTotalTimeMS': 'BIGINT UNSIGNED'
-    }, {
+    }
+    if args.cold:
+        db_fields['ColdBestExecTimeMS'] = 'BIGINT UNSIGNED'
+        db_fields['ColdBestTotalTimeMS'] = 'BIGINT UNSIGNED'
+    db_reporter = report.DbReport(db, "taxibench", db_fields, {
         'ScriptName': 'taxibench.py',
         'CommitHash': args.commit
     })
 
-for fs in args.fs:
+def executeCommand(session, commandStr):
+    if session is not None:
+        session.add(commandStr)
+        return
+    try:
+        process = subprocess.Popen(omnisciCmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
+        output = process.communicate(commandStr.encode())
+    except OSError as err:
+        print("Failed to start", omnisciCmdLine, err)
+    if args.sco:
+        print(str(output[0].strip().decode()))
+    print("Command returned", process.returncode)
+
+pymapdConnection = None
+if args.runner == 'pymapd':
+    print("Connecting to omnisci server")
+    pymapdConnection = connect(user="admin", password="HyperInteractive", host="localhost", dbname="omnisci", port=args.port)
+
+stagingTableImported = False
+
+def runFragmentSize(fs):
+    "Create table with fragment size, import data, run benchmarks and return sum of best exec times"
+    global stagingTableImported
+
     print("RUNNING WITH FRAGMENT SIZE", fs)
+    session = None
+    if args.session:
+        session = OmnisqlSession(omnisciCmdLine)
     # Delete old table
     if not args.dnd:
         print("Deleting taxitestdb old database")
-        try:
-            process = subprocess.Popen(omnisciCmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
-            output = process.communicate(command1DropTableTrips.encode())
-        except OSError as err:
-            print("Failed to start", omnisciCmdLine, err)
-        if args.sco:
-            print(str(output[0].strip().decode()))
-        print("Command returned", process.returncode)
+        executeCommand(session, command1DropTableTrips)
 
     dataFilesNumber = 0
     # Create table and import data
@@ -298,88 +471,204 @@ for fs in args.fs:
             # Foreign storage interface import with CREATE TABLE
             dataFilesNumber = 1
             print("Creating new table taxitestdb with fragment size", fs, "and data file", dataFileNames[0])
-            createTableStr = tripsCreateTableFSI % (fs, dataFileNames[0])
-            try:
-                process = subprocess.Popen(omnisciCmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
-                output = process.communicate(createTableStr.encode())
-            except OSError as err:
-                print("Failed to start", omnisciCmdLine, err)
-            if args.sco:
-                print(str(output[0].strip().decode()))
-            print("Command returned", process.returncode)
+            executeCommand(session, tripsCreateTableFSI % (fs, dataFileNames[0]))
+        elif args.staging:
+            # Import using COPY only once into staging table and copy it
+            # to table with required fragment size
+            dataFilesNumber = len(dataFileNames[:args.df])
+            if not stagingTableImported:
+                print("Creating new staging table", stagingTableName)
+                executeCommand(session, command3DropStagingTable)
+                executeCommand(session, tripsCreateTableOriginal.replace("CREATE TABLE taxitestdb (", "CREATE TABLE %s (" % stagingTableName) % fs)
+                for df in dataFileNames[:args.df]:
+                    print("Importing datafile", df, "into staging table")
+                    executeCommand(session, command2ImportCSV.replace("COPY taxitestdb", "COPY " + stagingTableName) % df)
+                stagingTableImported = True
+            print("Creating new table taxitestdb with fragment size", fs, "from staging table")
+            executeCommand(session, command4CopyStagingTable % fs)
         else:
             # Import using COPY
             # Create new table
             print("Creating new table taxitestdb with fragment size", fs)
-            createTableStr = tripsCreateTableOriginal % fs
-            try:
-                process = subprocess.Popen(omnisciCmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
-                output = process.communicate(createTableStr.encode())
-            except OSError as err:
-                print("Failed to start", omnisciCmdLine, err)
-            if args.sco:
-                print(str(output[0].strip().decode()))
-            print("Command returned", process.returncode)
+            executeCommand(session, tripsCreateTableOriginal % fs)
             # Datafiles import
             dataFilesNumber = len(dataFileNames[:args.df])
             for df in dataFileNames[:args.df]:
                 print("Importing datafile", df)
-                copyStr = command2ImportCSV % df
-                try:
-                    process = subprocess.Popen(omnisciCmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
-                    output = process.communicate(copyStr.encode())
-                except OSError as err:
-                    print("Failed to start", omnisciCmdLine, err)
-                if args.sco:
-                    print(str(output[0].strip().decode()))
-                print("Command returned", process.returncode)
+                executeCommand(session, command2ImportCSV % df)
+
+    if session is not None:
+        # Every iteration of every benchmark goes to the same omnisql process
+        # after table preparation commands, unless benchmarks are run by pymapd
+        commandsNumber = session.size()
+        if not args.throughput and pymapdConnection is None:
+            for benchString in benchmarksCode:
+                for cacheMode in cacheModes:
+                    for iii in range(1, args.t + 1):
+                        session.add(omnisqlBenchmarkCode(benchString, cacheMode))
+        print("Running", session.size(), "statements in one omnisql session")
+        sessionReturnCode, sessionOutputs = session.run()
+        print("Session returned", sessionReturnCode)
+        if args.sco:
+            for output in sessionOutputs[:commandsNumber]:
+                print(output)
+        benchmarkOutputs = iter(sessionOutputs[commandsNumber:])
+
+    if args.throughput:
+        try:
+            with open(args.tpr, "a") as report:
+                previousQPS = 0
+                clients = 1
+                while clients <= args.tpc:
+                    print("RUNNING THROUGHPUT TEST WITH", clients, "CLIENTS")
+                    results = runThroughput(clients, args.port, args.tpd)
+                    for result in results:
+                        print("QUERY", result['query'], "QPS", round(result['qps'], 2), "P50", formatLatency(result['p50']),
+                              "P95", formatLatency(result['p95']), "P99", formatLatency(result['p99']))
+                        print(dataFilesNumber, ",",
+                              fs, ",",
+                              clients, ",",
+                              result['query'], ",",
+                              result['count'], ",",
+                              result['errors'], ",",
+                              result['qps'], ",",
+                              result['p50'], ",",
+                              result['p95'], ",",
+                              result['p99'], '\n', file=report, sep='', end='', flush=True)
+                    totalQPS = sum(result['qps'] for result in results)
+                    print("CLIENTS", clients, "TOTAL QPS", round(totalQPS, 2))
+                    if previousQPS > 0 and totalQPS < previousQPS * (1 + args.tpt / 100):
+                        print("THROUGHPUT SATURATED AT", clients, "CLIENTS")
+                        break
+                    previousQPS = totalQPS
+                    clients *= 2
+        except IOError as err:
+            print("Failed writing report file", args.tpr, err)
+        return None
 
     # Benchmarks
+    totalExecTime = 0
     try:
-        with open(args.r, "w") as report:
+        with open(args.r, "a") as report:
             for benchNumber, benchString in enumerate(benchmarksCode, start=1):
-                bestExecTime = float("inf")
-                bestTotalTime = float("inf")
+                bestExecTimes = {}
+                bestTotalTimes = {}
                 errstr = ""
-                for iii in range(1, args.t + 1):
-                    print("Running benchmark number", benchNumber, "Iteration number", iii)
-                    try:
-                        process = subprocess.Popen(omnisciCmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
-                        output = str(process.communicate(benchString.encode())[0].strip().decode())
-                    except OSError as err:
-                        print("Failed to start", omnisciCmdLine, err)
-                    if args.sbo:
-                        print(output)
-                    print("Command returned", process.returncode)
-                    execTime = float("inf")
-                    totalTime = float("inf")
-                    if process.returncode == 0:
-                        matches = re.search(timingRegexpRegexp, output).groups()
-                        if len(matches) == 2:
-                            execTime = int(matches[0])
-                            totalTime = int(matches[1])
-                            print("Iteration", iii, "exec time", execTime, "total time", totalTime)
+                for cacheMode in cacheModes:
+                    bestExecTime = float("inf")
+                    bestTotalTime = float("inf")
+                    for iii in range(1, args.t + 1):
+                        print("Running benchmark number", benchNumber, "Iteration number", iii, "with", cacheMode, "cache")
+                        execTime = float("inf")
+                        totalTime = float("inf")
+                        rows = ""
+                        if pymapdConnection is not None:
+                            try:
+                                if cacheMode == 'cold':
+                                    pymapdConnection._client.clear_cpu_memory(pymapdConnection._session)
+                                timing = runBenchmarkPymapd(pymapdConnection, benchString)
+                                execTime = timing['execTime']
+                                totalTime = timing['totalTime']
+                                rows = timing['rows']
+                                print("Iteration", iii, "exec time", execTime, "total time", totalTime, "rows", rows)
+                            except Exception as err:
+                                print("Query failed:", err)
+                                errstr = str(err)
                         else:
-                            print("Failed to parse command output:", output)
-                            errstr = getErrorLine(strout)
-                    if bestExecTime > execTime:
-                        bestExecTime = execTime
-                    if bestTotalTime > totalTime:
-                        bestTotalTime = totalTime
+                            if session is not None:
+                                output = next(benchmarkOutputs)
+                                returnCode = sessionReturnCode
+                            else:
+                                try:
+                                    process = subprocess.Popen(omnisciCmdLine, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.PIPE)
+                                    output = str(process.communicate(omnisqlBenchmarkCode(benchString, cacheMode).encode())[0].strip().decode())
+                                except OSError as err:
+                                    print("Failed to start", omnisciCmdLine, err)
+                                returnCode = process.returncode
+                            if args.sbo:
+                                print(output)
+                            print("Command returned", returnCode)
+                            if returnCode == 0:
+                                matches = re.search(timingRegexpRegexp, output)
+                                if matches is not None:
+                                    execTime = int(matches.group(1))
+                                    totalTime = int(matches.group(2))
+                                    print("Iteration", iii, "exec time", execTime, "total time", totalTime)
+                                else:
+                                    print("Failed to parse command output:", output)
+                                    errstr = getErrorLine(output)
+                        if bestExecTime > execTime:
+                            bestExecTime = execTime
+                        if bestTotalTime > totalTime:
+                            bestTotalTime = totalTime
+                    bestExecTimes[cacheMode] = bestExecTime
+                    bestTotalTimes[cacheMode] = bestTotalTime
+                bestExecTime = bestExecTimes['warm']
+                bestTotalTime = bestTotalTimes['warm']
+                totalExecTime += bestExecTime
                 print("BENCHMARK", benchNumber, "exec time", bestExecTime, "total time", bestTotalTime)
                 print(dataFilesNumber, ",",
                       fs, ",",
                       benchNumber, ",",
                       bestExecTime, ",",
                       bestTotalTime, ",",
-                      errstr, '\n', file=report, sep='', end='', flush=True)
+                      errstr, ",",
+                      rows, file=report, sep='', end='', flush=True)
+                if args.cold:
+                    print("BENCHMARK", benchNumber, "cold exec time", bestExecTimes['cold'], "cold total time", bestTotalTimes['cold'])
+                    print(",", bestExecTimes['cold'], ",",
+                          bestTotalTimes['cold'], file=report, sep='', end='', flush=True)
+                print(file=report, flush=True)
                 if db_reporter is not None:
-                    db_reporter.submit({
+                    values = {
                         'FilesNumber': dataFilesNumber,
                         'FragmentSize': fs,
                         'BenchName': str(benchNumber),
                         'BestExecTimeMS': bestExecTime,
                         'BestTotalTimeMS': bestTotalTime
-                    })
+                    }
+                    if args.cold:
+                        values['ColdBestExecTimeMS'] = bestExecTimes['cold']
+                        values['ColdBestTotalTimeMS'] = bestTotalTimes['cold']
+                    db_reporter.submit(values)
     except IOError as err:
         print("Failed writing report file", args.r, err)
+    return totalExecTime
+
+try:
+    open(args.r, "w").close()
+except IOError as err:
+    print("Failed writing report file", args.r, err)
+
+if args.throughput:
+    # Throughput results of all fragment sizes are appended to one report
+    try:
+        with open(args.tpr, "w") as report:
+            print("datafiles,fragment_size,clients,query,queries_number,errors_number,qps,latency_p50,latency_p95,latency_p99", file=report, flush=True)
+    except IOError as err:
+        print("Failed writing report file", args.tpr, err)
+
+try:
+    if args.fst is not None:
+        if args.throughput:
+            print("Fragment size tuning is not supported in throughput mode")
+            sys.exit(3)
+        bestFragmentSize, curve = tune.tune_fragment_size(runFragmentSize, args.fst[0], args.fst[1], args.fstt)
+        if bestFragmentSize is None:
+            print("FRAGMENT SIZE TUNING FAILED, BENCHMARK FAILED FOR ALL PROBED FRAGMENT SIZES")
+        else:
+            print("BEST FRAGMENT SIZE", bestFragmentSize, "TOTAL EXEC TIME", dict(curve)[bestFragmentSize])
+        try:
+            with open(args.fstr, "w") as report:
+                print("fragment_size,total_exec_time", file=report, flush=True)
+                for fs, totalExecTime in curve:
+                    print(fs, ",", totalExecTime, '\n', file=report, sep='', end='', flush=True)
+        except IOError as err:
+            print("Failed writing report file", args.fstr, err)
+    else:
+        for fs in args.fs:
+            runFragmentSize(fs)
+finally:
+    if stagingTableImported:
+        print("Deleting staging table", stagingTableName)
+        executeCommand(None, command3DropStagingTable)
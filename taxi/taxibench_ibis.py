@@ -35,6 +35,8 @@ parser.add_argument('-dp', default=taxi_trips_directory, help="Wildcard pattern
 parser.add_argument('-i', default=5, type=int, help="Number of iterations to run every query. Best result is selected.")
 parser.add_argument('-dnd', action='store_true', help="Do not delete old table.")
 parser.add_argument('-dni', action='store_true', help="Do not create new table and import any data from CSV files.")
+parser.add_argument('-iw', default=1, type=int, help="Number of workers to import datafiles concurrently. Every worker uses its own connection to server.")
+parser.add_argument('-cold', action='store_true', help="Also run every query -i times with cold cache. Server CPU memory is cleared before every cold iteration. Best and average cold times are reported separately.")
 parser.add_argument("-port", default=62074, type=int, help="TCP port that omnisql client should use to connect to server.")
 
 parser.add_argument("-db-server", default="localhost", help="Host name of MySQL server.")
@@ -70,15 +72,20 @@ db_reporter = None
 if args.db_user is not "":
     print("Connecting to database")
     db = mysql.connector.connect(host=args.db_server, port=args.db_port, user=args.db_user, passwd=args.db_pass, db=args.db_name)
-    db_reporter = report.DbReport(db, args.db_table, {
+    db_fields = {
         'FilesNumber': 'INT UNSIGNED NOT NULL',
         'QueryName': 'VARCHAR(500) NOT NULL',
         'FirstExecTimeMS': 'BIGINT UNSIGNED',
         'WorstExecTimeMS': 'BIGINT UNSIGNED',
         'BestExecTimeMS': 'BIGINT UNSIGNED',
         'AverageExecTimeMS': 'BIGINT UNSIGNED',
-        'TotalTimeMS': 'BIGINT UNSIGNED'
-    }, {
+        'TotalTimeMS': 'BIGINT UNSIGNED',
+        'ImportTimeMS': 'BIGINT UNSIGNED'
+    }
+    if args.cold:
+        db_fields['ColdBestExecTimeMS'] = 'BIGINT UNSIGNED'
+        db_fields['ColdAverageExecTimeMS'] = 'BIGINT UNSIGNED'
+    db_reporter = report.DbReport(db, args.db_table, db_fields, {
         'ScriptName': 'taxibench_ibis.py',
         'CommitHash': args.commit
     })
@@ -116,9 +123,10 @@ except Exception as err:
 	print("Failed to create table:", err)
 
 # Create table and import data
+import_time = 0
 if not args.dni:
     # Datafiles import
-    omnisci_server.import_data(data_files_names, args.df)
+    import_time = omnisci_server.import_data(data_files_names, args.df, args.iw)
 
 try:
     db = conn.database(database_name)
@@ -154,6 +162,10 @@ def timeq(q):
     q(df)
     return time.time()-t
 
+def clear_cache():
+    "Clear server CPU memory so that next query runs with cold cache"
+    conn.con._client.clear_cpu_memory(conn.con._session)
+
 def queries_exec(index):
     if index == 1:
         return timeq(q1)
@@ -172,6 +184,17 @@ try:
     with open(args.r, "w") as report:
         t_begin = time.time()
         for bench_number in range(1,5):
+            cold_best_exec_time = float("inf")
+            cold_times_sum = 0.0
+            if args.cold:
+                for iteration in range(1, args.i + 1):
+                    print("RUNNING QUERY NUMBER", bench_number, "COLD ITERATION NUMBER", iteration)
+                    clear_cache()
+                    cold_exec_time = int(round(queries_exec(bench_number) * 1000))
+                    if cold_best_exec_time > cold_exec_time:
+                        cold_best_exec_time = cold_exec_time
+                    cold_times_sum += cold_exec_time
+                print("QUERY", bench_number, "COLD EXEC TIME MS", cold_best_exec_time)
             exec_times = [None]*5
             best_exec_time = float("inf")
             worst_exec_time = 0.0
@@ -198,17 +221,28 @@ try:
                   "BestExecTimeMS: ", best_exec_time, ",",
                   "AverageExecTimeMS: ", average_exec_time, ",",
                   "TotalTimeMS: ", total_exec_time, ",",
-                  "", '\n', file=report, sep='', end='', flush=True)
+                  "ImportTimeMS: ", import_time, ",",
+                  file=report, sep='', end='', flush=True)
+            if args.cold:
+                print("ColdBestExecTimeMS: ", cold_best_exec_time, ",",
+                      "ColdAverageExecTimeMS: ", cold_times_sum / args.i, ",",
+                      file=report, sep='', end='', flush=True)
+            print("", '\n', file=report, sep='', end='', flush=True)
             if db_reporter is not None:
-                db_reporter.submit({
+                values = {
                     'FilesNumber': data_files_number,
                     'QueryName': 'Query' + str(bench_number),
                     'FirstExecTimeMS': first_exec_time,
                     'WorstExecTimeMS': worst_exec_time,
                     'BestExecTimeMS': best_exec_time,
                     'AverageExecTimeMS': average_exec_time,
-                    'TotalTimeMS': total_exec_time
-                })
+                    'TotalTimeMS': total_exec_time,
+                    'ImportTimeMS': import_time
+                }
+                if args.cold:
+                    values['ColdBestExecTimeMS'] = cold_best_exec_time
+                    values['ColdAverageExecTimeMS'] = cold_times_sum / args.i
+                db_reporter.submit(values)
 except IOError as err:
     print("Failed writing report file", args.r, err)
 finally:
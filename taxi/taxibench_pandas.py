@@ -2,7 +2,13 @@ from braceexpand import braceexpand
 import mysql.connector
 import pandas as pd
 import numpy as np
+from pandas.api.types import is_datetime64_any_dtype
+import concurrent.futures
+import multiprocessing
 import argparse
+import tempfile
+import hashlib
+import shutil
 import pathlib
 import time
 import glob
@@ -100,24 +106,115 @@ def q4(df):
     transformed = df[['passenger_count','pickup_datetime','trip_distance']].transform({'passenger_count':lambda x: x,'pickup_datetime':lambda x:  pd.DatetimeIndex(x).year,'trip_distance': lambda x: x.round()}).groupby(['passenger_count','pickup_datetime','trip_distance'])
     return transformed.size().reset_index().sort_values(by=['pickup_datetime',0],ascending=[True,False])
 
+def pickup_year(df):
+    "Year of pickup, dates are parsed only if loader did not do it"
+    pickup = df['pickup_datetime']
+    if not is_datetime64_any_dtype(pickup):
+        pickup = pd.to_datetime(pickup)
+    return pickup.dt.year
+
+def q1_vectorized(df):
+    return df.groupby('cab_type', observed=True).size()
+
+def q2_vectorized(df):
+    return df.groupby('passenger_count', as_index=False, observed=True)['total_amount'].mean()
+
+def q3_vectorized(df):
+    return df.groupby([df['passenger_count'], pickup_year(df)], observed=True).size()
+
+def q4_vectorized(df):
+    grouped = df.groupby([df['passenger_count'], pickup_year(df), df['trip_distance'].round()], observed=True)
+    return grouped.size().reset_index().sort_values(by=['pickup_datetime',0],ascending=[True,False])
+
+# Implementation variants of every benchmark, baseline is used to compute speedup of others
 benchmarks = {
-    "MQ01.pd": q1,
-    "MQ02.pd": q2,
-    "MQ03.pd": q3,
-    "MQ04.pd": q4
+    "MQ01": {'baseline': q1, 'vectorized': q1_vectorized},
+    "MQ02": {'baseline': q2, 'vectorized': q2_vectorized},
+    "MQ03": {'baseline': q3, 'vectorized': q3_vectorized},
+    "MQ04": {'baseline': q4, 'vectorized': q4_vectorized}
 }
+query_variants = ['baseline', 'vectorized']
+
+def q1_partial(df):
+    return df.groupby('cab_type', observed=True).size()
+
+def q1_merge(partials):
+    return pd.concat(partials).groupby(level=0).sum()
+
+def q2_partial(df):
+    return df.groupby('passenger_count')['total_amount'].agg(['sum', 'count'])
+
+def q2_merge(partials):
+    merged = pd.concat(partials).groupby(level=0).sum()
+    return (merged['sum'] / merged['count']).rename('total_amount').reset_index()
+
+def q3_partial(df):
+    return df.groupby([df['passenger_count'], pickup_year(df)], observed=True).size()
+
+def q3_merge(partials):
+    return pd.concat(partials).groupby(level=[0, 1]).sum()
+
+def q4_partial(df):
+    return df.groupby([df['passenger_count'], pickup_year(df), df['trip_distance'].round()], observed=True).size()
+
+def q4_merge(partials):
+    merged = pd.concat(partials).groupby(level=[0, 1, 2]).sum()
+    return merged.reset_index().sort_values(by=['pickup_datetime',0],ascending=[True,False])
+
+# Streaming implementations of benchmarks compute partial aggregates for every chunk of data and merge them in the end
+streaming_benchmarks = {
+    "MQ01": (q1_partial, q1_merge),
+    "MQ02": (q2_partial, q2_merge),
+    "MQ03": (q3_partial, q3_merge),
+    "MQ04": (q4_partial, q4_merge)
+}
+
+# Columns used by every benchmark, typed loader reads only these
+benchmark_columns = {
+    "MQ01": ['cab_type'],
+    "MQ02": ['passenger_count', 'total_amount'],
+    "MQ03": ['passenger_count', 'pickup_datetime'],
+    "MQ04": ['passenger_count', 'pickup_datetime', 'trip_distance']
+}
+
+# Types of columns for typed loader, date columns are parsed once after reading
+taxi_dtypes = {
+    'cab_type': 'category',
+    'passenger_count': 'int16',
+    'total_amount': 'float64',
+    'trip_distance': 'float32',
+    'pickup_datetime': 'str'
+}
+taxi_date_format = "%Y-%m-%d %H:%M:%S"
+taxi_date_columns = ['pickup_datetime']
 
 # Load database reporting functions
 pathToReportDir = os.path.join(pathlib.Path(__file__).parent, "..", "report")
 print(pathToReportDir)
+pathToMemoryDir = os.path.join(pathlib.Path(__file__).parent, "..", "memory")
 sys.path.insert(1, pathToReportDir)
+sys.path.insert(1, pathToMemoryDir)
 import report
+import memory
 
 parser = argparse.ArgumentParser(description='Run NY Taxi benchmark using pandas')
 
 parser.add_argument('-r', default="report_pandas.csv", help="Report file name.")
 parser.add_argument('-df', default=1, type=int, help="Number of datafiles to input into database for processing.")
 parser.add_argument('-dp', help="Wildcard pattern of datafiles that should be loaded.")
+parser.add_argument('-loader', default=['baseline'], nargs='+', choices=['baseline', 'typed'], help="Datafiles loaders to measure. Baseline reads all columns with inferred types, typed reads only columns used by queries with explicit types and parses dates once. Load time and memory footprint of every loader are reported, queries are run on data from the last one.")
+parser.add_argument('-engine', default="pandas", choices=['pandas', 'modin'], help="Dataframe engine to run benchmark with. Modin engine is a drop-in replacement of pandas which scales across all cores.")
+parser.add_argument('-modin-engine', dest="modin_engine", default="ray", choices=['ray', 'dask'], help="Execution engine used by Modin.")
+parser.add_argument('-variants', default=['baseline'], nargs='+', choices=query_variants, help="Query implementation variants to run. Speedup of every variant over baseline is reported when baseline is run too.")
+parser.add_argument('-lw', dest="load_workers", default=[1], nargs='+', type=int, help="Numbers of worker processes to parse datafiles with. Every number is measured and reported to show scaling of load time. Parsed datafiles are passed from workers in Arrow IPC files in shared memory, numeric and date columns are used without copying. Requires pyarrow when more than one worker is used.")
+parser.add_argument('-assemble', default=['concat'], nargs='+', choices=['concat', 'prealloc'], help="Ways to assemble datafiles into single dataframe to measure. Concat concatenates dataframes of all datafiles, prealloc fills columns preallocated by size of the first datafile, growing them geometrically when needed, and unifies categories of categorical columns.")
+parser.add_argument('-streaming', action='store_true', help="Run queries in streaming mode. Datafiles are read in chunks by the last specified loader, partial aggregates of every chunk are merged in the end, so whole dataset is never kept in memory.")
+parser.add_argument('-chunksize', type=int, help="Number of rows in chunk for streaming mode. Whole datafiles are used as chunks by default.")
+parser.add_argument('-mem', action='store_true', help="Measure peak and delta resident set size of process for every query iteration. Maximum over iterations is reported.")
+parser.add_argument('-mem-interval', dest="mem_interval", default=10, type=int, help="Interval in milliseconds to sample resident set size with.")
+parser.add_argument('-tracemalloc', action='store_true', help="Measure peak of memory allocated by Python and NumPy with tracemalloc too, implies -mem. Slows execution down significantly.")
+parser.add_argument('-cache-dir', dest="cache_dir", help="Directory to keep parsed datafiles in Feather format. When cached copy of datafile exists and datafile was not modified, it is memory mapped instead of parsing CSV. Requires pyarrow.")
+parser.add_argument('-lr', dest="load_report", default="report_pandas_load.csv", help="Datafiles load report file name.")
 parser.add_argument('-i', dest="iterations", default=5, type=int, help="Number of iterations to run every benchmark. Best result is selected.")
 
 parser.add_argument("-db-server", default="localhost", help="Host name of MySQL server")
@@ -138,11 +235,40 @@ if args.df <= 0:
 if args.iterations < 1:
     print("Bad number of iterations specified", args.t)
 
+if min(args.load_workers) < 1:
+    print("Bad number of load workers specified", args.load_workers)
+    sys.exit(1)
+
+# Baseline is run first, speedup of other variants is computed from its time
+args.variants = sorted(set(args.variants), key=query_variants.index)
+
+if args.streaming and (args.variants != ['baseline'] or max(args.load_workers) > 1):
+    print("Streaming mode cannot be used with query variants or parallel loading")
+    sys.exit(1)
+
+if args.chunksize is not None and args.chunksize < 1:
+    print("Bad chunk size specified", args.chunksize)
+    sys.exit(1)
+
+if args.engine != 'pandas' and (max(args.load_workers) > 1 or args.assemble != ['concat']):
+    print("Parallel and preallocated loading is supported only by pandas engine")
+    sys.exit(1)
+
+if args.tracemalloc:
+    args.mem = True
+
+if args.engine == 'modin':
+    os.environ["MODIN_ENGINE"] = args.modin_engine.capitalize()
+    import modin.pandas as pd
+
+# Name of benchmarks and loaders in reports includes engine name
+engine_suffix = {'pandas': 'pd', 'modin': 'modin'}[args.engine]
+
 db_reporter = None
 if args.db_user is not "":
     print("Connecting to database")
     db = mysql.connector.connect(host=args.db_server, port=args.db_port, user=args.db_user, passwd=args.db_pass, db=args.db_name);
-    db_reporter = report.DbReport(db, args.db_table, {
+    db_fields = {
         'FilesNumber': 'INT UNSIGNED NOT NULL',
         'FragmentSize': 'BIGINT UNSIGNED NOT NULL',
         'BenchName': 'VARCHAR(500) NOT NULL',
@@ -152,7 +278,15 @@ if args.db_user is not "":
         'WorstTotalTimeMS': 'BIGINT UNSIGNED',
         'AverageExecTimeMS': 'BIGINT UNSIGNED',
         'AverageTotalTimeMS': 'BIGINT UNSIGNED'
-    }, {
+    }
+    if args.variants != ['baseline']:
+        db_fields['Speedup'] = 'DOUBLE'
+    if args.mem:
+        db_fields['PeakRSSMB'] = 'DOUBLE'
+        db_fields['DeltaRSSMB'] = 'DOUBLE'
+    if args.tracemalloc:
+        db_fields['TracedPeakMB'] = 'DOUBLE'
+    db_reporter = report.DbReport(db, args.db_table, db_fields, {
         'ScriptName': 'taxibench_pandas.py',
         'CommitHash': args.commit
     })
@@ -165,47 +299,318 @@ if len(dataFileNames) == 0:
 
 print("READING", args.df, "DATAFILES")
 dataFilesNumber = len(dataFileNames[:args.df])
-def read_datafile(f):
+def read_datafile(f, chunksize=None):
     print("READING DATAFILE", f)
-    return pd.read_csv(f, compression='gzip', header=None, names=taxi_names)
-df_from_each_file = (read_datafile(f) for f in dataFileNames[:args.df])
-concatenated_df = pd.concat(df_from_each_file, ignore_index=True)
+    return pd.read_csv(f, compression='gzip', header=None, names=taxi_names, chunksize=chunksize)
+
+typed_columns = sorted(set(c for columns in benchmark_columns.values() for c in columns))
+
+def parse_dates(df):
+    for c in taxi_date_columns:
+        if c in typed_columns:
+            df[c] = pd.to_datetime(df[c], format=taxi_date_format)
+    return df
+
+def read_datafile_typed(f, chunksize=None):
+    print("READING DATAFILE", f, "COLUMNS", typed_columns)
+    df = pd.read_csv(f, compression='gzip', header=None, names=taxi_names, usecols=typed_columns,
+                     dtype={c: taxi_dtypes[c] for c in typed_columns}, chunksize=chunksize)
+    if chunksize is None:
+        return parse_dates(df)
+    return (parse_dates(chunk) for chunk in df)
+
+loaders = {
+    'baseline': read_datafile,
+    'typed': read_datafile_typed
+}
+
+load_stats = {'cache_hits': 0, 'cache_misses': 0}
+
+def cached_datafile_name(f, loader):
+    "Cached datafile name depends on loader and datafile path, size and modification time"
+    stat = os.stat(f)
+    key = "%s:%s:%d:%d" % (loader, os.path.abspath(f), stat.st_size, stat.st_mtime_ns)
+    return os.path.join(args.cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".feather")
+
+def read_datafile_cached(f, loader):
+    import pyarrow.feather as feather
+    import pyarrow
+    cache_file = cached_datafile_name(f, loader)
+    if os.path.exists(cache_file):
+        print("READING CACHED DATAFILE", cache_file, "FOR", f)
+        load_stats['cache_hits'] += 1
+        df = feather.read_feather(cache_file, memory_map=True)
+        return df if args.engine == 'pandas' else pd.DataFrame(df)
+    load_stats['cache_misses'] += 1
+    df = loaders[loader](f)
+    print("CACHING DATAFILE", f, "AS", cache_file)
+    os.makedirs(args.cache_dir, exist_ok=True)
+    try:
+        # Uncompressed file is memory mapped by reader without decompression
+        df.to_feather(cache_file + ".tmp", compression='uncompressed')
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError) as err:
+        # Columns with values of mixed types inferred by baseline loader can't be stored
+        print("FAILED CACHING DATAFILE", f, err)
+        if os.path.exists(cache_file + ".tmp"):
+            os.remove(cache_file + ".tmp")
+        return df
+    os.replace(cache_file + ".tmp", cache_file)
+    return df
+
+def read_datafile_shared(f, loader, shm_file):
+    "Parse datafile in worker process and pass it to parent process in Arrow IPC file in shared memory"
+    import pyarrow.feather as feather
+    load_stats['cache_hits'] = load_stats['cache_misses'] = 0
+    if args.cache_dir is not None:
+        df = read_datafile_cached(f, loader)
+    else:
+        df = loaders[loader](f)
+    # Single record batch lets parent process use columns without concatenating chunks
+    feather.write_feather(df, shm_file, compression='uncompressed', chunksize=max(len(df), 1))
+    return dict(load_stats)
+
+def read_datafiles_parallel(loader, workers):
+    import pyarrow.ipc
+    shm_dir = tempfile.mkdtemp(prefix="taxibench_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    try:
+        # Fork is required because benchmark script cannot be imported by spawned processes
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+            shm_files = [os.path.join(shm_dir, "%d.arrow" % i) for i in range(dataFilesNumber)]
+            futures = [pool.submit(read_datafile_shared, f, loader, shm_file)
+                       for f, shm_file in zip(dataFileNames[:args.df], shm_files)]
+            for future, shm_file in zip(futures, shm_files):
+                stats = future.result()
+                load_stats['cache_hits'] += stats['cache_hits']
+                load_stats['cache_misses'] += stats['cache_misses']
+                # Numeric and date columns are views of memory mapped file, it stays in
+                # shared memory after removal until dataframe is released
+                df = pyarrow.ipc.open_file(pyarrow.memory_map(shm_file)).read_all().to_pandas(split_blocks=True, self_destruct=True)
+                os.remove(shm_file)
+                yield df
+    finally:
+        shutil.rmtree(shm_dir, ignore_errors=True)
+
+def assemble_preallocated(df_from_each_file, files_number):
+    """Fill preallocated columns by every datafile instead of concatenation, categorical columns get union of categories of all datafiles.
+    Columns are preallocated for files_number datafiles as large as the first one and grow geometrically when they are exceeded"""
+    columns = None
+    categories = {}
+    offset = 0
+    for df in df_from_each_file:
+        rows = len(df)
+        if columns is None:
+            capacity = rows * files_number
+            columns = {}
+            for c in df.columns:
+                if df[c].dtype.name == 'category':
+                    columns[c] = np.empty(capacity, dtype=np.int32)
+                    categories[c] = df[c].cat.categories[:0]
+                else:
+                    columns[c] = np.empty(capacity, dtype=df[c].dtype if isinstance(df[c].dtype, np.dtype) else object)
+        if offset + rows > capacity:
+            capacity = max(2 * capacity, offset + rows)
+            for c, a in columns.items():
+                columns[c] = np.empty(capacity, dtype=a.dtype)
+                columns[c][:offset] = a[:offset]
+        for c in df.columns:
+            if c in categories:
+                new_categories = df[c].cat.categories
+                categories[c] = categories[c].append(new_categories[~new_categories.isin(categories[c])])
+                recode = categories[c].get_indexer(new_categories)
+                codes = df[c].cat.codes.to_numpy()
+                columns[c][offset:offset + rows] = np.where(codes < 0, -1, recode[codes])
+            else:
+                values = df[c].to_numpy()
+                # Inferred types of columns may differ between datafiles
+                if not np.can_cast(values.dtype, columns[c].dtype, casting='safe'):
+                    columns[c] = columns[c].astype(np.result_type(columns[c].dtype, values.dtype))
+                columns[c][offset:offset + rows] = values
+        offset += rows
+        del df
+    return pd.DataFrame({c: pd.Categorical.from_codes(a[:offset], categories[c]) if c in categories else a[:offset]
+                         for c, a in columns.items()}, copy=False)
+
+def load_datafiles(loader, workers, assemble):
+    if workers > 1:
+        df_from_each_file = read_datafiles_parallel(loader, workers)
+    elif args.cache_dir is not None:
+        df_from_each_file = (read_datafile_cached(f, loader) for f in dataFileNames[:args.df])
+    else:
+        df_from_each_file = (loaders[loader](f) for f in dataFileNames[:args.df])
+    if assemble == 'prealloc':
+        return assemble_preallocated(df_from_each_file, len(dataFileNames[:args.df]))
+    df = pd.concat(df_from_each_file, ignore_index=True)
+    if loader == 'typed':
+        # Concatenation of categoricals with different categories results in object column
+        for c, t in taxi_dtypes.items():
+            if t == 'category' and c in df.columns and df[c].dtype.name != 'category':
+                df[c] = df[c].astype('category')
+    return df
+
+def read_datafiles_chunks(loader):
+    for f in dataFileNames[:args.df]:
+        if args.chunksize is not None:
+            yield from loaders[loader](f, args.chunksize)
+        elif args.cache_dir is not None:
+            yield read_datafile_cached(f, loader)
+        else:
+            yield loaders[loader](f)
+
+def run_streaming(loader):
+    "Run all benchmarks over chunks of datafiles, returns best exec time of every benchmark, best read time and maximum chunk memory"
+    bestExecTimes = dict.fromkeys(streaming_benchmarks, float("inf"))
+    bestLoadTime = float("inf")
+    memory_mb = 0
+    for iii in range(1, args.iterations + 1):
+        print("RUNNING STREAMING BENCHMARKS ITERATION NUMBER", iii)
+        load_stats['cache_hits'] = load_stats['cache_misses'] = 0
+        partials = {benchName: [] for benchName in streaming_benchmarks}
+        execTimes = dict.fromkeys(streaming_benchmarks, 0)
+        loadTime = 0
+        t1 = time.time()
+        for chunk in read_datafiles_chunks(loader):
+            loadTime += time.time() - t1
+            for benchName, (partial, merge) in streaming_benchmarks.items():
+                t1 = time.time()
+                partials[benchName].append(partial(chunk))
+                execTimes[benchName] += time.time() - t1
+            memory_mb = max(memory_mb, chunk.memory_usage(deep=True).sum())
+            del chunk
+            t1 = time.time()
+        loadTime += time.time() - t1
+        for benchName, (partial, merge) in streaming_benchmarks.items():
+            t1 = time.time()
+            merge(partials[benchName])
+            execTimes[benchName] += time.time() - t1
+        for benchName in streaming_benchmarks:
+            bestExecTimes[benchName] = min(bestExecTimes[benchName], int(round(execTimes[benchName] * 1000)))
+        bestLoadTime = min(bestLoadTime, int(round(loadTime * 1000)))
+    return bestExecTimes, bestLoadTime, int(round(memory_mb / 1024 / 1024))
+
+def format_mb(value):
+    return "%.1f" % value if value is not None else ""
+
+def report_benchmark(report, variantName, bestExecTime, speedup, memoryUsage):
+    print("BENCHMARK", variantName, "EXEC TIME", bestExecTime,
+          "SPEEDUP", "%.2f" % speedup if speedup is not None else "N/A")
+    if args.mem:
+        print("BENCHMARK", variantName, "PEAK RSS MB", format_mb(memoryUsage['peak_rss']),
+              "DELTA RSS MB", format_mb(memoryUsage['delta_rss']), "TRACED PEAK MB", format_mb(memoryUsage['traced_peak']))
+    print(dataFilesNumber, ",",
+          0, ",",
+          variantName, ",",
+          bestExecTime, ",",
+          bestExecTime, ",",
+          bestExecTime, ",",
+          bestExecTime, ",",
+          bestExecTime, ",",
+          bestExecTime, ",",
+          "", file=report, sep='', end='', flush=True)
+    if args.variants != ['baseline']:
+        print(",", "%.2f" % speedup if speedup is not None else "", file=report, sep='', end='', flush=True)
+    if args.mem:
+        print(",", format_mb(memoryUsage['peak_rss']), ",", format_mb(memoryUsage['delta_rss']), file=report, sep='', end='', flush=True)
+    if args.tracemalloc:
+        print(",", format_mb(memoryUsage['traced_peak']), file=report, sep='', end='', flush=True)
+    print('', file=report, flush=True)
+    if db_reporter is not None:
+        result = {
+            'FilesNumber': dataFilesNumber,
+            'FragmentSize': 0,
+            'BenchName': variantName,
+            'BestExecTimeMS': bestExecTime,
+            'BestTotalTimeMS': bestExecTime,
+            'WorstExecTimeMS': bestExecTime,
+            'WorstTotalTimeMS': bestExecTime,
+            'AverageExecTimeMS': bestExecTime,
+            'AverageTotalTimeMS': bestExecTime
+        }
+        if args.variants != ['baseline']:
+            result['Speedup'] = speedup
+        if args.mem:
+            result['PeakRSSMB'] = memoryUsage['peak_rss']
+            result['DeltaRSSMB'] = memoryUsage['delta_rss']
+        if args.tracemalloc:
+            result['TracedPeakMB'] = memoryUsage['traced_peak']
+        db_reporter.submit(result)
+
+load_results = []
+if args.streaming:
+    loader = args.loader[-1]
+    with memory.MemoryMonitor(args.mem_interval / 1000) as monitor:
+        streamingExecTimes, load_time, memory_mb = run_streaming(loader)
+    rss = int(round(monitor.peak_rss))
+    print("LOADER", loader, "STREAMING READ TIME", load_time, "MAX CHUNK MEMORY MB", memory_mb, "PEAK RSS MB", rss,
+          "CACHE HITS", load_stats['cache_hits'], "CACHE MISSES", load_stats['cache_misses'])
+    load_results.append([dataFilesNumber, loader + "." + engine_suffix + ":streaming", 1, "streaming", load_stats['cache_hits'], load_stats['cache_misses'], load_time, memory_mb, rss])
+else:
+    for loader in args.loader:
+        for workers in args.load_workers:
+            for assemble in args.assemble:
+                load_stats['cache_hits'] = load_stats['cache_misses'] = 0
+                concatenated_df = None
+                # Peak RSS of loading is sampled when kernel peak can't be reset
+                with memory.MemoryMonitor(args.mem_interval / 1000) as monitor:
+                    t_load = time.time()
+                    concatenated_df = load_datafiles(loader, workers, assemble)
+                    load_time = int(round((time.time() - t_load) * 1000))
+                rss = int(round(monitor.peak_rss))
+                memory_mb = int(round(concatenated_df.memory_usage(deep=True).sum() / 1024 / 1024))
+                print("LOADER", loader, "WORKERS", workers, "ASSEMBLE", assemble, "LOAD TIME", load_time, "MEMORY MB", memory_mb,
+                      "PEAK RSS MB", rss, "CACHE HITS", load_stats['cache_hits'], "CACHE MISSES", load_stats['cache_misses'])
+                load_results.append([dataFilesNumber, loader + "." + engine_suffix, workers, assemble, load_stats['cache_hits'], load_stats['cache_misses'], load_time, memory_mb, rss])
+
+try:
+    with open(args.load_report, "w") as report:
+        print("datafiles,loader,workers,assemble,cache_hits,cache_misses,load_time_ms,memory_mb,peak_rss_mb", file=report, flush=True)
+        for result in load_results:
+            print(*result, sep=',', file=report, flush=True)
+except IOError as err:
+    print("Failed writing report file", args.load_report, err)
 
 try:
     with open(args.r, "w") as report:
-        for benchName, query in benchmarks.items():
-            bestExecTime = float("inf")
-            for iii in range(1, args.iterations + 1):
-                print("RUNNING BENCHMARK NUMBER", benchName, "ITERATION NUMBER", iii)
-                query_df = concatenated_df
-                t1 = time.time()
-                query(query_df)
-                t2 = time.time()
-                ttt = int(round((t2 - t1) * 1000))
-                if bestExecTime > ttt:
-                    bestExecTime = ttt
-            print("BENCHMARK", benchName, "EXEC TIME", bestExecTime)
-            print(dataFilesNumber, ",",
-                  0, ",",
-                  benchName, ",",
-                  bestExecTime, ",",
-                  bestExecTime, ",",
-                  bestExecTime, ",",
-                  bestExecTime, ",",
-                  bestExecTime, ",",
-                  bestExecTime, ",",
-                  "", '\n', file=report, sep='', end='', flush=True)
-            if db_reporter is not None:
-                db_reporter.submit({
-                    'FilesNumber': dataFilesNumber,
-                    'FragmentSize': 0,
-                    'BenchName': benchName,
-                    'BestExecTimeMS': bestExecTime,
-                    'BestTotalTimeMS': bestExecTime,
-                    'WorstExecTimeMS': bestExecTime,
-                    'WorstTotalTimeMS': bestExecTime,
-                    'AverageExecTimeMS': bestExecTime,
-                    'AverageTotalTimeMS': bestExecTime
-                })
+        if args.streaming:
+            for benchName, bestExecTime in streamingExecTimes.items():
+                # Memory usage of queries can't be separated in streaming mode
+                report_benchmark(report, benchName + "." + engine_suffix + ":streaming", bestExecTime, None,
+                                 dict.fromkeys(['peak_rss', 'delta_rss', 'traced_peak']))
+        else:
+            for benchName, variants in benchmarks.items():
+                baselineTime = None
+                for variant in args.variants:
+                    query = variants[variant]
+                    variantName = benchName + "." + engine_suffix
+                    if variant != 'baseline':
+                        variantName += ":" + variant
+                    bestExecTime = float("inf")
+                    memoryUsage = dict.fromkeys(['peak_rss', 'delta_rss', 'traced_peak'])
+                    for iii in range(1, args.iterations + 1):
+                        print("RUNNING BENCHMARK NUMBER", variantName, "ITERATION NUMBER", iii)
+                        query_df = concatenated_df
+                        if args.mem:
+                            with memory.MemoryMonitor(args.mem_interval / 1000, args.tracemalloc) as monitor:
+                                t1 = time.time()
+                                query(query_df)
+                                t2 = time.time()
+                            print("ITERATION", iii, "PEAK RSS MB", format_mb(monitor.peak_rss),
+                                  "DELTA RSS MB", format_mb(monitor.delta_rss), "TRACED PEAK MB", format_mb(monitor.traced_peak))
+                            for key in memoryUsage:
+                                value = getattr(monitor, key)
+                                if value is not None:
+                                    memoryUsage[key] = value if memoryUsage[key] is None else max(memoryUsage[key], value)
+                        else:
+                            t1 = time.time()
+                            query(query_df)
+                            t2 = time.time()
+                        ttt = int(round((t2 - t1) * 1000))
+                        if bestExecTime > ttt:
+                            bestExecTime = ttt
+                    if variant == 'baseline':
+                        baselineTime = bestExecTime
+                    speedup = None
+                    if baselineTime is not None:
+                        speedup = baselineTime / max(bestExecTime, 1)
+                    report_benchmark(report, variantName, bestExecTime, speedup, memoryUsage)
 except IOError as err:
     print("Failed writing report file", args.r, err)
@@ -0,0 +1,63 @@
+import math
+
+_golden_ratio = (math.sqrt(5) - 1) / 2
+
+def tune_fragment_size(measure, fs_min, fs_max, threshold=0.01, patience=2):
+    """Search for fragment size with the smallest total query time
+
+    Golden-section search is done on logarithmic scale of fragment size
+    between fs_min and fs_max, assuming that total time has a single
+    minimum in this range. measure(fs) is called once for every probed
+    fragment size and should return total query time. Search stops when
+    the best time improves by less than threshold (relative) for
+    patience probes in a row or when probes can't be distinguished
+    after rounding fragment size to integer. Failed probes, for which
+    measure returns None, don't improve the best time, so search stops
+    after patience probes if all of them fail.
+
+    Returns
+    -------
+    Best fragment size (None if all probes failed) and list of
+    (fragment size, total time) pairs for every probed fragment size
+    sorted by fragment size.
+    """
+
+    curve = {}
+
+    def probe(x):
+        fs = int(round(math.exp(x)))
+        if fs not in curve:
+            print("TUNING FRAGMENT SIZE, PROBING", fs)
+            total_time = measure(fs)
+            curve[fs] = float("inf") if total_time is None else total_time
+            print("FRAGMENT SIZE", fs, "TOTAL TIME", curve[fs])
+        return curve[fs]
+
+    a = math.log(min(fs_min, fs_max))
+    b = math.log(max(fs_min, fs_max))
+    c = b - _golden_ratio * (b - a)
+    d = a + _golden_ratio * (b - a)
+    fc = probe(c)
+    fd = probe(d)
+    best_time = min(fc, fd)
+    steps_without_improvement = 0 if not math.isinf(best_time) else len(curve)
+    while steps_without_improvement < patience and int(round(math.exp(c))) != int(round(math.exp(d))):
+        if fc <= fd:
+            b, d, fd = d, c, fc
+            c = b - _golden_ratio * (b - a)
+            fc = probe(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + _golden_ratio * (b - a)
+            fd = probe(d)
+        new_best_time = min(curve.values())
+        if not math.isinf(new_best_time) and (math.isinf(best_time) or best_time - new_best_time > threshold * best_time):
+            steps_without_improvement = 0
+        else:
+            steps_without_improvement += 1
+        best_time = new_best_time
+
+    best_fs = min(curve, key=curve.get)
+    if math.isinf(curve[best_fs]):
+        best_fs = None
+    return best_fs, sorted(curve.items())